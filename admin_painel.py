@@ -1,9 +1,12 @@
 # ATUAL/admin_panel.py - VERSÃO COMPLETA E FINAL
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
 from datetime import timedelta
 import logging
 import database as db
+import response_cache
+import metrics
+from config import METRICS_TOKEN
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -41,8 +44,8 @@ def admin_dashboard():
     if 'user_id' not in session or not db.get_user(session['username'])['is_admin']:
         return redirect(url_for('login'))
     
-    clients = db.get_all_clients()
-    return render_template('admin_dashboard.html', clients=clients)
+    # A lista de clientes é carregada aos poucos pela página (/api/clients)
+    return render_template('admin_dashboard.html')
 
 @app.route('/add_client', methods=['POST'])
 def add_client():
@@ -58,7 +61,8 @@ def add_client():
     responsavel = request.form['responsavel']
 
     if db.add_user(username, password, is_admin=False, razao_social=razao_social, cnpj=cnpj, email=email, telefone=telefone, responsavel=responsavel):
-        db.log_event('Novo Cliente Cadastrado', message=f'Admin {session["username"]} cadastrou o cliente {username}.')
+        new_client = db.get_user(username)
+        db.log_event('Novo Cliente Cadastrado', message=f'Admin {session["username"]} cadastrou o cliente {username}.', user_id=new_client['id'])
         flash(f'Cliente "{username}" cadastrado com sucesso!', 'success')
     else:
         flash(f'Erro: Nome de usuário "{username}" já existe.', 'danger')
@@ -74,7 +78,7 @@ def update_client_status_route(user_id):
     if user:
         new_status = 'inativo' if user['status'] == 'ativo' else 'ativo'
         db.update_user_status(user_id, new_status)
-        db.log_event('Status Alterado', message=f'Status do cliente ID {user_id} alterado para {new_status}.')
+        db.log_event('Status Alterado', message=f'Status do cliente ID {user_id} alterado para {new_status}.', user_id=user_id)
         flash(f'Status do cliente alterado para {new_status}.', 'info')
     
     return redirect(url_for('admin_dashboard'))
@@ -86,7 +90,7 @@ def delete_client_route():
     
     user_id = request.json.get('user_id')
     db.delete_user(user_id)
-    db.log_event('Cliente Deletado', message=f'Cliente com ID {user_id} foi deletado.')
+    db.log_event('Cliente Deletado', message=f'Cliente com ID {user_id} foi deletado.', user_id=user_id)
     return {'success': True, 'message': 'Cliente deletado com sucesso.'}
 
 @app.route('/metrics_dashboard')
@@ -100,17 +104,64 @@ def api_dashboard_charts():
     if 'user_id' not in session:
         return jsonify({'error': 'Não autorizado'}), 401
         
-    agent_runs = db.get_agent_start_logs()
-    error_logs = db.get_error_logs()
-    success_posts = db.get_all_published_posts()
-    
-    response_data = {
-        'agent_health': {
-            'labels': ['Execuções do Agente', 'Publicações com Sucesso', 'Erros Críticos'],
-            'data': [len(agent_runs), len(success_posts), len(error_logs)]
+    # Séries opcionais: ?bucket=day&days=30 ou ?bucket=client
+    bucket = request.args.get('bucket')
+    days = request.args.get('days', 30, type=int)
+
+    def build():
+        counts = db.get_agent_health_counts()
+
+        response_data = {
+            'agent_health': {
+                'labels': ['Execuções do Agente', 'Publicações com Sucesso', 'Erros Críticos'],
+                'data': [counts['agent_runs'], counts['published_posts'], counts['errors']]
+            }
         }
-    }
-    return jsonify(response_data)
+
+        event_types = [db.PUBLISH_SUCCESS_EVENT, db.PUBLISH_ERROR_EVENT]
+        if bucket == 'day':
+            response_data['daily'] = db.get_event_counts_by_day(event_types, days=days)
+        elif bucket == 'client':
+            response_data['per_client'] = db.get_event_counts_by_client(event_types)
+        return response_data
+
+    # Os gráficos agregam todos os clientes: dependem do escopo global
+    return response_cache.cached_json('dashboard_charts', [None], build)
+
+# --- LISTAGENS PAGINADAS (?limit=N&after=<cursor>) ---
+def _page_args():
+    limit = request.args.get('limit', db.PAGE_SIZE_DEFAULT, type=int)
+    return min(max(limit, 1), db.PAGE_SIZE_MAX), request.args.get('after') or None
+
+@app.route('/api/clients')
+def api_clients():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autorizado'}), 401
+    limit, after = _page_args()
+    try:
+        return jsonify(db.get_clients_page(limit, after))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/logs')
+def api_logs():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autorizado'}), 401
+    limit, after = _page_args()
+    try:
+        return jsonify(db.get_logs_page(limit, after, user_id=request.args.get('user_id', type=int)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/news_metrics')
+def api_news_metrics():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Não autorizado'}), 401
+    limit, after = _page_args()
+    try:
+        return jsonify(db.get_news_metrics_page(limit, after, user_id=request.args.get('user_id', type=int)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/add_topics', methods=['POST'])
 def add_topics():
@@ -146,19 +197,35 @@ def api_client_dashboard_charts(user_id):
     client = db.get_user_by_id(user_id)
     if not client:
         return jsonify({'error': 'Cliente não encontrado'}), 404
-    
-    username = client['username']
 
-    success_logs = db.get_success_logs_for_client(username)
-    error_logs = db.get_error_logs_for_client(username)
-    
-    response_data = {
-        'agent_performance': {
-            'labels': ['Publicações com Sucesso', 'Falhas na Publicação'],
-            'data': [len(success_logs), len(error_logs)]
+    bucket = request.args.get('bucket')
+    days = request.args.get('days', 30, type=int)
+
+    def build():
+        event_types = [db.PUBLISH_SUCCESS_EVENT, db.PUBLISH_ERROR_EVENT]
+        counts = db.get_client_event_counts(user_id, event_types)
+
+        response_data = {
+            'agent_performance': {
+                'labels': ['Publicações com Sucesso', 'Falhas na Publicação'],
+                'data': [counts[db.PUBLISH_SUCCESS_EVENT], counts[db.PUBLISH_ERROR_EVENT]]
+            }
         }
-    }
-    return jsonify(response_data)
+
+        if bucket == 'day':
+            response_data['daily'] = db.get_event_counts_by_day(event_types, days=days, user_id=user_id)
+        return response_data
+
+    return response_cache.cached_json('client_dashboard_charts', [user_id], build)
+
+# Métricas deste processo no formato do Prometheus (as do agente ficam no
+# servidor lateral dele, ver AGENT_METRICS_PORT). Acesso para administradores
+# logados ou para o coletor, com o METRICS_TOKEN no cabeçalho Authorization.
+@app.route('/metrics')
+def prometheus_metrics():
+    if 'user_id' not in session and not metrics.token_matches(request.headers.get('Authorization'), METRICS_TOKEN):
+        return Response('Não autorizado\n', status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     print("--- Iniciando o Painel do ADMINISTRADOR (VERSÃO ATUAL) ---")
@@ -1,25 +1,115 @@
 # ATUAL/agente.py - VERSÃO COMPLETA E ATUALIZADA (PLANO Z)
 
+import argparse
 import schedule
 import time
-import random
+import asyncio
+import contextlib
 from datetime import datetime
 from pytz import timezone
-import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import database as db
 import wordpress_client
 import instagram_client
 import email_client
+import publish_scheduler
+import fingerprints
+import metrics
+from async_engine import get_engine, run_blocking
+from job_queue import WorkerPool, current_stop_check
+from sharding import ShardMembership
 from config import (
     PUBLISH_TIMES, EMAIL_REPORT_TIMES, REMIX_TASK_TIMES, TIMEZONE,
-    PAUSE_MIN_MINUTES, PAUSE_MAX_MINUTES,
+    MAX_CONCURRENT_CLIENTS, PUBLISH_RUN_DEADLINE_MINUTES, STATS_COLLECTION_WORKERS,
+    JOB_WORKER_CONCURRENCY, JOB_MAX_ATTEMPTS, SHARDING_ENABLED, AGENT_METRICS_PORT, METRICS_TOKEN,
+    BLOCK_DUPLICATE_STORIES_PER_ACCOUNT,
     EMAIL_SENDER, EMAIL_PASSWORD
 )
 
-def run_threaded(job_func):
-    job_thread = threading.Thread(target=job_func)
-    job_thread.start()
+def _score_and_record(client, noticias):
+    # Cópias da mesma notícia na lista viram uma só; as que o cliente já analisou
+    # com outro post ID (republicadas pelo site) não voltam a ser pontuadas
+    noticias = fingerprints.annotate(noticias)
+    analisadas = db.get_analyzed_fingerprints_among(client['id'], [n['fingerprint_id'] for n in noticias])
+    noticias = [n for n in noticias if analisadas.get(n['fingerprint_id'], n['id']) == n['id']]
+
+    top_3_noticias = wordpress_client.calculate_engagement_scores(noticias, client=client, top_k=3)
+
+    print(f"[INFO] TOP 3 notícias selecionadas para {client['username']}:")
+    for i, noticia in enumerate(top_3_noticias):
+        print(f"  {i+1}. {noticia['title']} (Score: {noticia['score']:.2f})")
+        db.add_news_metric(client['id'], noticia['id'], noticia['title'], noticia['link'], noticia['score'], noticia['fingerprint_id'])
+    return top_3_noticias
+
+async def process_client_async(client, deadline, raise_errors=False, feeds=None, semaphore=None, should_stop=None):
+    """
+    Executa a cadeia coleta -> score -> login -> publicação de um único cliente,
+    no event loop do agente, e só retorna quando as publicações terminam.
+    Com `raise_errors`, o erro é registrado e repassado (para a fila tentar de novo).
+    `feeds` (wordpress_client.SiteFeeds) compartilha a coleta entre os clientes da rodada.
+    `semaphore` limita só a preparação (as pausas entre publicações não ocupam vaga);
+    `should_stop` interrompe a cadeia de publicações (ver PublishScheduler.publish).
+    """
+    print(f"\n--- Processando cliente: {client['username']} (ID: {client['id']}) ---")
+    db.log_event("Processamento de Cliente", f"Iniciando para o cliente {client['username']}.", user_id=client['id'])
+    started_at = time.perf_counter()
+
+    try:
+        async with semaphore or contextlib.nullcontext():
+            print(f"[WORDPRESS] Coletando notícias de: {client['wordpress_url']}")
+            if feeds is not None:
+                noticias = await feeds.get(client['wordpress_url'])
+            else:
+                noticias = await wordpress_client.get_latest_news_async(client['wordpress_url'])
+            metrics.record_client(client['id'], 'coleta_wordpress', bool(noticias))
+            if not noticias:
+                db.log_event("Coleta WordPress", f"Nenhuma notícia encontrada para {client['username']}.", user_id=client['id'])
+                return
+
+            top_3_noticias = await run_blocking(_score_and_record, client, noticias)
+
+            insta_api = await run_blocking(instagram_client.login, client['instagram_user'], client['instagram_pass'])
+            metrics.record_client(client['id'], 'login_instagram', bool(insta_api))
+            if not insta_api:
+                db.log_event("Erro de Publicação", f"Falha no login do Instagram para {client['username']}.", user_id=client['id'])
+                return
+
+            # Uma única consulta, restrita às notícias candidatas desta rodada
+            ids_ja_publicados = await run_blocking(db.get_published_post_ids_among, client['id'], [n['id'] for n in top_3_noticias])
+            pendentes = [noticia for noticia in top_3_noticias if noticia['id'] not in ids_ja_publicados]
+            if BLOCK_DUPLICATE_STORIES_PER_ACCOUNT and pendentes:
+                # A mesma notícia já publicada nesta conta, com outro post ID ou por outro cliente
+                repetidas = await run_blocking(db.get_published_fingerprints_for_account, client['instagram_user'], [n['fingerprint_id'] for n in pendentes])
+                pendentes = [noticia for noticia in pendentes if noticia['fingerprint_id'] not in repetidas]
+
+        # As pausas entre publicações (e os limites da conta) ficam a cargo do
+        # agendador de publicações, fora do semáforo da preparação.
+        await publish_scheduler.get_scheduler().publish(client, insta_api, pendentes, deadline, should_stop)
+
+    except Exception as e:
+        db.log_event("Erro Crítico", f"Erro no processamento do cliente {client['username']}: {str(e)}", user_id=client['id'])
+        if raise_errors:
+            raise
+    finally:
+        metrics.CLIENT_LAST_RUN_SECONDS.set(time.perf_counter() - started_at, client_id=client['id'])
+
+async def _publish_round(clients, deadline):
+    """Processa todos os clientes no event loop. Retorna quantos ficaram pendentes no prazo."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CLIENTS)
+    # Clientes que usam o mesmo site compartilham uma única coleta por rodada
+    feeds = wordpress_client.SiteFeeds()
+    sites = {wordpress_client.site_key(client['wordpress_url']) for client in clients}
+    print(f"[WORDPRESS] {len(clients)} cliente(s) usando {len(sites)} site(s) distinto(s).")
+
+    async def process(client):
+        await process_client_async(client, deadline, feeds=feeds, semaphore=semaphore)
+
+    tasks = [asyncio.ensure_future(process(client)) for client in clients]
+    _, pending = await asyncio.wait(tasks, timeout=max(0, deadline - time.monotonic()))
+    for task in pending:
+        task.cancel()
+    return len(pending)
 
 def run_analysis_and_publish_task():
     print("\n" + "="*50)
@@ -31,52 +121,13 @@ def run_analysis_and_publish_task():
         db.log_event("Tarefa de Publicação", "Nenhum cliente ativo encontrado.")
         return
 
-    for client in active_clients:
-        print(f"\n--- Processando cliente: {client['username']} (ID: {client['id']}) ---")
-        db.log_event("Processamento de Cliente", f"Iniciando para o cliente {client['username']}.")
+    # Os clientes rodam como corrotinas no event loop do agente; o tempo total
+    # passa a ser o do cliente mais lento, e não a soma de todos.
+    deadline = time.monotonic() + PUBLISH_RUN_DEADLINE_MINUTES * 60
+    pending = get_engine().run(_publish_round(active_clients, deadline))
 
-        try:
-            print(f"[WORDPRESS] Coletando notícias de: {client['wordpress_url']}")
-            noticias = wordpress_client.get_latest_news(client['wordpress_url'])
-            if not noticias:
-                db.log_event("Coleta WordPress", f"Nenhuma notícia encontrada para {client['username']}.")
-                continue
-
-            noticias_com_score = wordpress_client.calculate_engagement_scores(noticias)
-            top_3_noticias = sorted(noticias_com_score, key=lambda x: x['score'], reverse=True)[:3]
-
-            print(f"[INFO] TOP 3 notícias selecionadas para {client['username']}:")
-            for i, noticia in enumerate(top_3_noticias):
-                print(f"  {i+1}. {noticia['title']} (Score: {noticia['score']:.2f})")
-                db.add_news_metric(client['id'], noticia['id'], noticia['title'], noticia['link'], noticia['score'])
-
-            insta_api = instagram_client.login(client['instagram_user'], client['instagram_pass'])
-            if not insta_api:
-                db.log_event("Erro de Publicação", f"Falha no login do Instagram para {client['username']}.")
-                continue
-
-            for noticia in top_3_noticias:
-                ids_ja_publicados = db.get_published_post_ids(client['id'])
-                if noticia['id'] in ids_ja_publicados:
-                    continue
-
-                print(f"\n[INSTAGRAM] Tentando publicar: '{noticia['title']}'")
-                success = instagram_client.post_to_instagram(insta_api, noticia)
-                
-                if success:
-                    db.add_published_post(client['id'], noticia['id'])
-                    db.log_event("Publicação Instagram", f"Sucesso ao publicar '{noticia['title']}' para {client['username']}.")
-                    
-                    pause_duration = random.randint(PAUSE_MIN_MINUTES * 60, PAUSE_MAX_MINUTES * 60)
-                    minutes, seconds = divmod(pause_duration, 60)
-                    print(f"[INFO] Pausando por {minutes} minutos e {seconds} segundos...")
-                    time.sleep(pause_duration)
-                else:
-                    db.log_event("Erro de Publicação", f"Falha ao publicar '{noticia['title']}' para {client['username']}.")
-                    time.sleep(60)
-
-        except Exception as e:
-            db.log_event("Erro Crítico", f"Erro no processamento do cliente {client['username']}: {str(e)}")
+    if pending:
+        db.log_event("Tarefa de Publicação", f"Prazo da rodada esgotado com {pending} cliente(s) pendente(s).")
 
     print("\n" + "="*50)
     print("FIM DA TAREFA DE ANÁLISE E PUBLICAÇÃO")
@@ -94,41 +145,72 @@ def send_email_report_task():
         db.log_event("Relatório por Email", "Nenhum cliente configurado para receber relatórios.")
         return
 
+    reports = []
+    report_clients = []
     for client in clients_with_email:
         try:
-            client_metrics = db.get_news_metrics_by_user(client['id'])
-            if not client_metrics:
+            # Lê o top do dia já materializado, sem varrer o histórico do cliente
+            daily_report = db.get_latest_daily_report(client['id'])
+            if not daily_report:
                 continue
             
-            top_3_client = sorted(client_metrics, key=lambda x: x['score'], reverse=True)[:3]
-            
-            email_client.send_report(
-                sender=EMAIL_SENDER,
-                password=EMAIL_PASSWORD,
-                recipient=client['report_email'],
-                top_news=top_3_client
-            )
-            db.log_event("Relatório por Email", f"Relatório enviado para {client['username']} em {client['report_email']}.")
+            reports.append({'recipient': client['report_email'], 'top_news': daily_report['top_news']})
+            report_clients.append(client)
         except Exception as e:
-            db.log_event("Erro Crítico", f"Falha ao enviar relatório para {client['username']}: {str(e)}")
+            db.log_event("Erro Crítico", f"Falha ao enviar relatório para {client['username']}: {str(e)}", user_id=client['id'])
+
+    # Todos os relatórios saem pelas mesmas conexões SMTP autenticadas
+    results = email_client.send_reports(sender=EMAIL_SENDER, password=EMAIL_PASSWORD, reports=reports)
+    for client, result in zip(report_clients, results):
+        metrics.record_client(client['id'], 'relatorio_email', result['success'])
+        if result['success']:
+            db.log_event("Relatório por Email", f"Relatório enviado para {client['username']} em {client['report_email']}.", user_id=client['id'])
+        else:
+            db.log_event("Erro Crítico", f"Falha ao enviar relatório para {client['username']}: {result['error']}", user_id=client['id'])
+
+def _fetch_account_stats(client):
+    print(f"[STATS] Coletando estatísticas para {client['instagram_user']}")
+    return instagram_client.get_user_stats(client['instagram_user'], client['instagram_pass'])
 
 def collect_instagram_stats_task():
+    now = datetime.now(timezone(TIMEZONE))
     print("\n" + "="*50)
-    print(f"INICIANDO TAREFA DE COLETA DE ESTATÍSTICAS - {datetime.now(timezone(TIMEZONE)).strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"INICIANDO TAREFA DE COLETA DE ESTATÍSTICAS - {now.strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*50)
 
     active_clients = db.get_all_active_client_configs()
+    if not active_clients:
+        return
+
+    # Cada conta é consultada uma única vez, mesmo que atenda a vários clientes,
+    # e as consultas rodam em paralelo reaproveitando as sessões já abertas.
+    clients_by_account = {}
     for client in active_clients:
-        try:
-            print(f"[STATS] Coletando estatísticas para {client['username']}")
-            stats = instagram_client.get_user_stats(client['instagram_user'], client['instagram_pass'])
+        clients_by_account.setdefault(client['instagram_user'], []).append(client)
+
+    stats_by_account = {}
+    with ThreadPoolExecutor(max_workers=STATS_COLLECTION_WORKERS, thread_name_prefix="estatisticas") as executor:
+        futures = {executor.submit(_fetch_account_stats, clients[0]): account for account, clients in clients_by_account.items()}
+        for future, account in futures.items():
+            try:
+                stats_by_account[account] = future.result()
+            except Exception as e:
+                for client in clients_by_account[account]:
+                    db.log_event("Erro Crítico", f"Falha na coleta de stats para {client['username']}: {str(e)}", user_id=client['id'])
+
+    rows = []
+    for account, stats in stats_by_account.items():
+        for client in clients_by_account[account]:
+            metrics.record_client(client['id'], 'estatisticas', bool(stats))
             if stats:
-                db.save_instagram_stats(client['id'], stats['followers'], stats['following'], stats['media_count'])
-                db.log_event("Coleta de Estatísticas", f"Sucesso ao coletar estatísticas para {client['username']}.")
+                rows.append((client['id'], stats['followers'], stats['following'], stats['media_count']))
+                db.log_event("Coleta de Estatísticas", f"Sucesso ao coletar estatísticas para {client['username']}.", user_id=client['id'])
             else:
-                db.log_event("Erro de Estatísticas", f"Falha ao coletar estatísticas para {client['username']}.")
-        except Exception as e:
-            db.log_event("Erro Crítico", f"Falha na coleta de stats para {client['username']}: {str(e)}")
+                db.log_event("Erro de Estatísticas", f"Falha ao coletar estatísticas para {client['username']}.", user_id=client['id'])
+
+    # Uma única transação para o dia inteiro; reexecutar no mesmo dia só atualiza os valores
+    db.save_instagram_stats_batch(now.strftime('%Y-%m-%d'), rows)
+    print(f"[STATS] Estatísticas gravadas para {len(rows)} de {len(active_clients)} cliente(s).")
 
 # NOVA FUNÇÃO PARA O PLANO Z
 def run_remix_task():
@@ -173,44 +255,117 @@ def run_remix_task():
             # Exemplo futuro:
             # success = instagram_client.find_and_remix_reel(client['instagram_user'], client['instagram_pass'], search_query)
             # if success:
-            #     db.log_event("Tarefa de Remix", f"Sucesso ao criar remix sobre '{topic}' para {client['username']}.")
+            #     db.log_event("Tarefa de Remix", f"Sucesso ao criar remix sobre '{topic}' para {client['username']}.", user_id=client['id'])
             # else:
-            #     db.log_event("Erro de Remix", f"Falha ao criar remix sobre '{topic}' para {client['username']}.")
+            #     db.log_event("Erro de Remix", f"Falha ao criar remix sobre '{topic}' para {client['username']}.", user_id=client['id'])
 
         except Exception as e:
-            db.log_event("Erro Crítico", f"Falha na tarefa de remix para {client['username']}: {str(e)}")
+            db.log_event("Erro Crítico", f"Falha na tarefa de remix para {client['username']}: {str(e)}", user_id=client['id'])
 
     print("\n" + "="*50)
     print("FIM DA TAREFA DE REMIX")
     print("="*50)
 
 
-def main():
-    print("="*50)
-    print("Agente Inteligente Multi-Cliente iniciado.")
-    print(f"Fuso horário configurado para: {TIMEZONE}")
-    print("Agendando tarefas...")
-    
+# --- FILA DE TAREFAS ---
+# O agendador apenas enfileira; quem executa são os workers (neste ou em outros processos).
+
+# Limita os jobs de publicação em preparação (coleta, score e login) neste processo;
+# criado no event loop do agente, na primeira execução
+_prepare_semaphore = None
+
+async def publish_client_job(client_id):
+    """
+    Job da fila: publicação para um único cliente. Roda no event loop do agente
+    e só termina depois das publicações; se o cliente mudar de shard, a cadeia para.
+    """
+    global _prepare_semaphore
+    if _prepare_semaphore is None:
+        _prepare_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CLIENTS)
+    client = await run_blocking(db.get_active_client_config, client_id)
+    if not client:
+        return
+    deadline = time.monotonic() + PUBLISH_RUN_DEADLINE_MINUTES * 60
+    await process_client_async(client, deadline, raise_errors=True, semaphore=_prepare_semaphore, should_stop=current_stop_check())
+
+TASK_HANDLERS = {
+    'publicacao': publish_client_job,
+    'relatorio': send_email_report_task,
+    'remix': run_remix_task,
+    'estatisticas': collect_instagram_stats_task,
+}
+
+def enqueue_publish_jobs():
+    """Enfileira um job de publicação por cliente ativo (ignorando quem já tem um job ativo)."""
+    active_clients = db.get_all_active_client_configs()
+    if not active_clients:
+        db.log_event("Tarefa de Publicação", "Nenhum cliente ativo encontrado.")
+        return
+    enqueued = sum(db.enqueue_job('publicacao', client['id'], JOB_MAX_ATTEMPTS) for client in active_clients)
+    print(f"[FILA] {enqueued} job(s) de publicação enfileirado(s) para {len(active_clients)} cliente(s).")
+
+def enqueue_task(task):
+    if db.enqueue_job(task, None, JOB_MAX_ATTEMPTS):
+        print(f"[FILA] Job '{task}' enfileirado.")
+    else:
+        print(f"[FILA] Job '{task}' já está na fila ou em execução; ignorado.")
+
+def schedule_tasks():
     schedule.clear()
 
     for t in PUBLISH_TIMES:
-        schedule.every().day.at(t, TIMEZONE).do(run_threaded, run_analysis_and_publish_task)
+        schedule.every().day.at(t, TIMEZONE).do(enqueue_publish_jobs)
         print(f"- Tarefa de Publicação agendada para as {t}")
 
     for t in EMAIL_REPORT_TIMES:
-        schedule.every().day.at(t, TIMEZONE).do(run_threaded, send_email_report_task)
+        schedule.every().day.at(t, TIMEZONE).do(enqueue_task, 'relatorio')
         print(f"- Tarefa de Relatório por Email agendada para as {t}")
 
     # Agendamento da nova tarefa de remix
     for t in REMIX_TASK_TIMES:
-        schedule.every().day.at(t, TIMEZONE).do(run_threaded, run_remix_task)
+        schedule.every().day.at(t, TIMEZONE).do(enqueue_task, 'remix')
         print(f"- Tarefa de Remix agendada para as {t}")
 
     # Agendamento da coleta de estatísticas (uma vez por dia)
-    schedule.every().day.at("23:55", TIMEZONE).do(run_threaded, collect_instagram_stats_task)
+    schedule.every().day.at("23:55", TIMEZONE).do(enqueue_task, 'estatisticas')
     print("- Tarefa de Coleta de Estatísticas agendada para as 23:55")
 
-    print("Agendamento concluído. O agente está em modo de espera.")
+def main(mode='completo', workers=JOB_WORKER_CONCURRENCY, sharding=SHARDING_ENABLED, instance_id=None, metrics_port=AGENT_METRICS_PORT):
+    """
+    Modos de execução:
+    - completo: agenda as tarefas e executa os jobs neste processo;
+    - agendador: apenas enfileira os jobs nos horários configurados;
+    - worker: apenas executa os jobs da fila (pode haver vários processos).
+    Com `sharding`, cada instância executa só os jobs dos clientes da sua partição.
+    Com `metrics_port`, as métricas do processo ficam em http://<host>:<porta>/metrics.
+    """
+    print("="*50)
+    print(f"Agente Inteligente Multi-Cliente iniciado (modo: {mode}).")
+    print(f"Fuso horário configurado para: {TIMEZONE}")
+
+    # Garante que o banco esteja com o esquema (e as migrações) em dia
+    db.create_tables()
+
+    if metrics_port:
+        if METRICS_TOKEN:
+            metrics.start_http_server(metrics_port, METRICS_TOKEN)
+            print(f"Métricas disponíveis em http://0.0.0.0:{metrics_port}/metrics (com o METRICS_TOKEN)")
+        else:
+            print("[ERRO MÉTRICAS] Servidor de métricas não iniciado: configure o METRICS_TOKEN.")
+
+    if mode in ('completo', 'agendador'):
+        print("Agendando tarefas...")
+        schedule_tasks()
+        print("Agendamento concluído.")
+
+    if mode in ('completo', 'worker'):
+        membership = None
+        if sharding:
+            membership = ShardMembership(instance_id)
+            membership.start()
+        WorkerPool(TASK_HANDLERS, concurrency=workers, membership=membership).start()
+
+    print("O agente está em modo de espera.")
     print("="*50)
 
     while True:
@@ -218,4 +373,11 @@ def main():
         time.sleep(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Agente NewsBot")
+    parser.add_argument('modo', nargs='?', default='completo', choices=['completo', 'agendador', 'worker'])
+    parser.add_argument('--workers', type=int, default=JOB_WORKER_CONCURRENCY, help="threads de worker neste processo")
+    parser.add_argument('--shards', action='store_true', default=SHARDING_ENABLED, help="divide os clientes entre as instâncias vivas")
+    parser.add_argument('--instancia', default=None, help="identificador estável desta instância (padrão: host-pid)")
+    parser.add_argument('--metricas-porta', type=int, default=AGENT_METRICS_PORT, help="porta do servidor lateral de métricas (/metrics)")
+    args = parser.parse_args()
+    main(args.modo, args.workers, args.shards, args.instancia, args.metricas_porta)
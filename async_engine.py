@@ -0,0 +1,50 @@
+# async_engine.py - Event loop do agente
+#
+# Um único event loop, rodando numa thread própria, conduz a coleta, o login e
+# as publicações de todos os clientes como corrotinas. O que ainda é bloqueante
+# (SQLite, instagrapi) roda num executor com poucas threads, via run_blocking.
+# As partes síncronas do agente (agendador, workers da fila) entregam o trabalho
+# ao loop com submit/run.
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ASYNC_BLOCKING_WORKERS
+
+class AsyncEngine:
+    def __init__(self, blocking_workers=ASYNC_BLOCKING_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=blocking_workers, thread_name_prefix="bloqueante")
+        self.loop.set_default_executor(self.executor)
+        self._thread = threading.Thread(target=self._run, name="async-engine", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Agenda a corrotina no loop e devolve um concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Executa a corrotina no loop e espera o resultado (para chamadas de outras threads)."""
+        return self.submit(coro).result(timeout)
+
+async def run_blocking(func, *args, **kwargs):
+    """Executa uma função bloqueante no executor do loop, sem travar as demais corrotinas."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Event loop compartilhado pelo processo (criado na primeira chamada)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine()
+        return _engine
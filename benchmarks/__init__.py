@@ -0,0 +1,5 @@
+# benchmarks/ - Medições de desempenho do NewsBot
+#
+# Cada módulo pode ser executado diretamente, por exemplo:
+#   python -m benchmarks.title_sanitizer
+#   python -m benchmarks.load --clients 200 --event-logs 1000000
@@ -0,0 +1,212 @@
+# benchmarks/fakes.py - Serviços falsos para os testes de carga
+#
+# Servidor WordPress REST local, servidor SMTP local e um cliente do Instagram
+# de mentira, todos com latência configurável. Nada aqui sai da máquina.
+
+import json
+import time
+import base64
+import threading
+import socketserver
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# --- WORDPRESS ---
+
+class FakeWordPress:
+    """
+    Servidor REST no formato de /wp-json/wp/v2/posts. Cada site é um prefixo de
+    caminho (/site-<n>/wp-json/...). A cada `new_round()` todos os sites ganham
+    `posts_per_round` posts novos, como um portal de notícias ativo; entre rodadas
+    o servidor responde 304 às requisições condicionais.
+    """
+
+    def __init__(self, posts_per_round=5, latency=0.0):
+        self.posts_per_round = posts_per_round
+        self.latency = latency
+        self.round = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fake-wordpress", daemon=True).start()
+        self.new_round()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def site_url(self, site):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/site-{site}"
+
+    def new_round(self):
+        with self._lock:
+            self.round += 1
+
+    def _posts(self, site, after):
+        posts = []
+        for round_number in range(self.round, 0, -1):
+            for index in range(self.posts_per_round, 0, -1):
+                post_id = round_number * 1000 + index
+                date = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(1_700_000_000 + post_id * 60))
+                if after and date <= after:
+                    return posts
+                posts.append({
+                    'id': post_id,
+                    'date': date,
+                    'date_gmt': date,
+                    'link': f"https://site-{site}.exemplo.com.br/noticia-{post_id}",
+                    'title': {'rendered': f"Not&iacute;cia {post_id} do site {site} &#8211; <em>urgente</em>"},
+                })
+                if len(posts) >= 10:
+                    return posts
+        return posts
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                    etag = f'"rodada-{fake.round}"'
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlparse(self.path)
+                site = url.path.strip('/').split('/')[0].replace('site-', '')
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                query = parse_qs(url.query)
+                body = json.dumps(fake._posts(site, query.get('after', [None])[0])).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', formatdate(usegmt=True))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+# --- SMTP ---
+
+class FakeSMTP:
+    """Servidor SMTP mínimo (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA) que só conta as mensagens."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fake-smtp", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b"\r\n")
+
+            def handle(self):
+                self.reply("220 fake-smtp pronto")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                    elif verb == 'AUTH':
+                        parts = command.split()
+                        if parts[1].upper() == 'LOGIN':
+                            for prompt in ("334 " + base64.b64encode(b"Username:").decode(), "334 " + base64.b64encode(b"Password:").decode()):
+                                self.reply(prompt)
+                                self.rfile.readline()
+                        elif len(parts) == 2:
+                            self.reply("334 ")
+                            self.rfile.readline()
+                        self.reply("235 autenticado")
+                    elif verb == 'DATA':
+                        self.reply("354 termine com <CRLF>.<CRLF>")
+                        while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                            pass
+                        if fake.latency:
+                            time.sleep(fake.latency)
+                        with fake._lock:
+                            fake.messages += 1
+                        self.reply("250 mensagem aceita")
+                    elif verb == 'QUIT':
+                        self.reply("221 encerrando")
+                        return
+                    else:
+                        # MAIL, RCPT, RSET, NOOP
+                        self.reply("250 ok")
+
+        return Handler
+
+# --- INSTAGRAM ---
+
+class StubInstagramClient:
+    """Substitui instagrapi.Client: mesmas chamadas usadas pelo agente, com latência fixa."""
+
+    latency = 0.0
+    logins = 0
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.username = None
+        self._settings = {'uuids': {'uuid': 'stub'}}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def login(self, username, password):
+        self._wait()
+        with StubInstagramClient._lock:
+            StubInstagramClient.logins += 1
+        self.username = username
+        return True
+
+    def set_uuids(self, uuids):
+        self._settings['uuids'] = uuids
+
+    def get_settings(self):
+        return dict(self._settings)
+
+    def set_settings(self, settings):
+        self._settings = dict(settings)
+
+    def get_timeline_feed(self):
+        self._wait()
+        return {'status': 'ok'}
+
+    def user_info_by_username(self, username):
+        self._wait()
+        seed = sum(username.encode('utf-8'))
+        return type('UserInfo', (), {'follower_count': 1000 + seed, 'following_count': 100, 'media_count': seed % 500})()
+
+def stub_post_to_instagram(cl, noticia):
+    """Substitui instagram_client.post_to_instagram (que hoje só simula com um sleep de 2s)."""
+    cl._wait()
+    return True
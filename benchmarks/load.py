@@ -0,0 +1,267 @@
+# benchmarks/load.py - Teste de carga das tarefas do agente e das APIs dos painéis
+#
+# Uso: python -m benchmarks.load --clients 500 --event-logs 2000000 --db benchmark.db
+#
+# Popula o banco indicado com dados sintéticos, sobe um WordPress e um SMTP
+# falsos, troca o instagrapi por um stub e mede cada tarefa: vazão, latência
+# p50/p99 por item (cliente, email, conta ou requisição) e pico de memória
+# alocada (tracemalloc). O resultado sai em JSON, para comparar entre versões.
+# Nunca aponte --db para o agente.db de produção.
+
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import platform
+import functools
+import tracemalloc
+import contextlib
+
+import database as db
+from config import JOB_WORKER_CONCURRENCY
+from benchmarks import fakes
+from benchmarks.seed import seed
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+@contextlib.contextmanager
+def timed(owner, name, samples):
+    """Troca owner.name por uma versão que registra a duração de cada chamada (síncrona ou async)."""
+    original = getattr(owner, name)
+
+    if inspect.iscoroutinefunction(original):
+        @functools.wraps(original)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+    else:
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+
+    setattr(owner, name, wrapper)
+    try:
+        yield samples
+    finally:
+        setattr(owner, name, original)
+
+def measure(run, samples, items):
+    """Executa `run()` medindo tempo total e pico de memória; `items()` conta o trabalho feito."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    done = items()
+    return {
+        'items': done,
+        'seconds': round(elapsed, 3),
+        'throughput_per_s': round(done / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 2) if samples else None,
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2) if samples else None,
+        'peak_memory_mb': round(peak / 2**20, 2),
+    }
+
+def _configure_agent(args, wordpress, smtp):
+    """Aponta o agente para os serviços falsos e tira as pausas de publicação."""
+    import agente
+    import email_client
+    import instagram_client
+    import rate_limiter
+    from cryptography.fernet import Fernet
+
+    fakes.StubInstagramClient.latency = args.instagram_latency
+    instagram_client.Client = fakes.StubInstagramClient
+    # Chave descartável: as sessões salvas no banco de teste entram na medição
+    instagram_client._fernet = Fernet(Fernet.generate_key())
+    instagram_client.post_to_instagram = fakes.stub_post_to_instagram
+
+    rate_limiter.PAUSE_MIN_MINUTES = rate_limiter.PAUSE_MAX_MINUTES = 0
+    rate_limiter.INSTAGRAM_POSTS_PER_HOUR = rate_limiter.INSTAGRAM_POSTS_PER_DAY = 10**9
+
+    class LocalSMTPConnection(email_client.SMTPConnection):
+        def __init__(self, sender, password):
+            super().__init__(sender, password, host='127.0.0.1', port=smtp.port)
+
+    email_client.EMAIL_USE_TLS = False
+    email_client.SMTPConnection = LocalSMTPConnection
+    return agente
+
+def bench_publish(agente, wordpress, workers):
+    """
+    Rodada de publicação pelo caminho de produção: o agendador enfileira um job
+    por cliente (agente.enqueue_publish_jobs) e um WorkerPool executa os jobs
+    (agente.publish_client_job) até a fila esvaziar.
+    """
+    from job_queue import WorkerPool
+
+    samples = []
+    with db.db_connection() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM published_posts").fetchone()[0]
+        # Cada rodada coleta de novo: o cache da rodada anterior não vale como recente
+        conn.execute("UPDATE wordpress_fetch_cache SET fetched_at = datetime('now', '-1 day')")
+
+    def published():
+        with db.db_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM published_posts").fetchone()[0] - before
+
+    def pending_jobs():
+        with db.db_connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE task = 'publicacao' AND state IN ('pendente', 'executando')"
+            ).fetchone()[0]
+
+    def run():
+        pool = WorkerPool(agente.TASK_HANDLERS, concurrency=workers, worker_id='benchmark')
+        pool.start()
+        try:
+            agente.enqueue_publish_jobs()
+            while pending_jobs():
+                time.sleep(0.05)
+        finally:
+            pool.stop()
+
+    wordpress.new_round()
+    with timed(agente, 'process_client_async', samples):
+        result = measure(run, samples, published)
+    with db.db_connection() as conn:
+        result['failed_jobs'] = conn.execute("SELECT COUNT(*) FROM jobs WHERE task = 'publicacao' AND state = 'falhou'").fetchone()[0]
+    result['latency_item'] = 'cliente (coleta, score, login e publicações)'
+    result['items_unit'] = 'publicações'
+    return result
+
+def bench_reports(agente, smtp):
+    import email_client
+    samples = []
+    before = smtp.messages
+    with timed(email_client.SMTPConnection, 'send', samples):
+        result = measure(agente.send_email_report_task, samples, lambda: smtp.messages - before)
+    result['latency_item'] = 'email'
+    result['items_unit'] = 'emails'
+    return result
+
+def bench_stats(agente):
+    samples = []
+    with timed(agente, '_fetch_account_stats', samples):
+        result = measure(agente.collect_instagram_stats_task, samples, lambda: len(samples))
+    result['latency_item'] = 'conta do Instagram'
+    result['items_unit'] = 'contas'
+    return result
+
+def bench_panels(user_ids, requests_per_endpoint):
+    import admin_painel
+    import client_panel
+
+    results = {}
+    admin = admin_painel.app.test_client()
+    with admin.session_transaction() as flask_session:
+        flask_session['user_id'] = 0
+        flask_session['username'] = 'benchmark'
+    client = client_panel.app.test_client()
+
+    endpoints = {
+        'admin_dashboard_charts': lambda i: admin.get('/api/dashboard_charts?bucket=day'),
+        'admin_logs_page': lambda i: admin.get('/api/logs?limit=50'),
+        'admin_client_charts': lambda i: admin.get(f'/api/client_dashboard_charts/{user_ids[i % len(user_ids)]}?bucket=day'),
+    }
+
+    def client_panel_data(i):
+        with client.session_transaction() as flask_session:
+            flask_session['user_id'] = user_ids[i % len(user_ids)]
+            flask_session['username'] = f"bench{user_ids[i % len(user_ids)]}"
+        return client.get('/api/client_panel_data')
+    endpoints['client_panel_data'] = client_panel_data
+
+    for name, call in endpoints.items():
+        samples = []
+
+        def run():
+            for i in range(requests_per_endpoint):
+                start = time.perf_counter()
+                response = call(i)
+                samples.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name}: HTTP {response.status_code}")
+
+        results[name] = measure(run, samples, lambda: len(samples))
+        results[name]['latency_item'] = 'requisição'
+        results[name]['items_unit'] = 'requisições'
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga do NewsBot")
+    parser.add_argument('--db', default='benchmark.db', help="arquivo SQLite usado no teste (recriado)")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--event-logs', type=int, default=1_000_000)
+    parser.add_argument('--news-metrics', type=int, default=500_000)
+    parser.add_argument('--published-posts', type=int, default=200_000)
+    parser.add_argument('--clients-per-site', type=int, default=1, help="clientes apontando para o mesmo site do WordPress falso")
+    parser.add_argument('--wordpress-latency', type=float, default=0.05, help="latência do WordPress falso (s)")
+    parser.add_argument('--instagram-latency', type=float, default=0.05, help="latência do stub do Instagram (s)")
+    parser.add_argument('--smtp-latency', type=float, default=0.01, help="latência do SMTP falso por mensagem (s)")
+    parser.add_argument('--panel-requests', type=int, default=200, help="requisições por endpoint dos painéis")
+    parser.add_argument('--workers', type=int, default=JOB_WORKER_CONCURRENCY, help="threads do WorkerPool nas rodadas de publicação")
+    parser.add_argument('--rounds', type=int, default=2, help="rodadas de publicação (cada uma com posts novos no WordPress falso)")
+    parser.add_argument('--output', default=None, help="grava o JSON neste arquivo além de imprimir")
+    args = parser.parse_args(argv)
+
+    if os.path.basename(args.db) == 'agente.db' and os.path.exists(args.db):
+        parser.error("o teste recria o banco; não use um agente.db existente")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    db.DATABASE_NAME = args.db
+
+    wordpress = fakes.FakeWordPress(latency=args.wordpress_latency).start()
+    smtp = fakes.FakeSMTP(latency=args.smtp_latency).start()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        db.create_tables()
+        start = time.perf_counter()
+        site_url = lambda user_id: wordpress.site_url((user_id - 1) // max(1, args.clients_per_site) + 1)
+        seeded = seed(args.clients, args.event_logs, args.news_metrics, args.published_posts, site_url)
+        seed_seconds = time.perf_counter() - start
+    agente = _configure_agent(args, wordpress, smtp)
+
+    with db.db_connection() as conn:
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE is_admin = 0 ORDER BY id")]
+
+    tasks = {}
+    for round_number in range(1, args.rounds + 1):
+        tasks[f'publish_round_{round_number}'] = bench_publish(agente, wordpress, args.workers)
+    db.flush_logs()
+    tasks['email_reports'] = bench_reports(agente, smtp)
+    tasks['instagram_stats'] = bench_stats(agente)
+    db.flush_logs()
+    tasks.update(bench_panels(user_ids, args.panel_requests))
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'environment': {'python': platform.python_version(), 'sqlite': db.sqlite3.sqlite_version, 'cpus': os.cpu_count()},
+        'seed': {'rows': seeded, 'seconds': round(seed_seconds, 2)},
+        'wordpress_requests': wordpress.requests,
+        'tasks': tasks,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output + '\n')
+    print(output)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
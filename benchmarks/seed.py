@@ -0,0 +1,108 @@
+# benchmarks/seed.py - Popula um banco com clientes e histórico sintéticos
+#
+# As linhas são inseridas direto com executemany em lotes grandes (sem passar
+# pelas funções do agente), para chegar a milhões de registros em poucos segundos.
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import bcrypt
+
+import database as db
+
+SEED_BATCH_SIZE = 50_000
+
+_EVENT_TYPES = [
+    ('Início do Agente', 1),
+    ('Processamento de Cliente', 30),
+    ('Coleta WordPress', 10),
+    ('Publicação Instagram', 30),
+    ('Erro de Publicação', 3),
+    ('Relatório por Email', 5),
+    ('Coleta de Estatísticas', 10),
+    ('Erro Crítico', 1),
+]
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(sql, rows):
+    total = 0
+    for batch in _batches(rows):
+        with db.db_connection() as conn:
+            conn.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+def _timestamps(count, days, rng):
+    now = datetime.now(timezone.utc)
+    for _ in range(count):
+        yield (now - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+def seed(clients, event_logs, news_metrics, published_posts, site_url, stats_days=365, history_days=365, rng_seed=42):
+    """
+    Cria `clients` clientes ativos (um site falso e uma conta do Instagram cada)
+    e distribui entre eles o histórico pedido. `site_url(n)` devolve a URL do
+    site do cliente n. Retorna a quantidade de linhas criadas por tabela.
+    """
+    rng = random.Random(rng_seed)
+    password_hash = bcrypt.hashpw(b'benchmark', bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+    with db.db_connection() as conn:
+        first_id = (conn.execute("SELECT IFNULL(MAX(id), 0) FROM users").fetchone()[0]) + 1
+    user_ids = list(range(first_id, first_id + clients))
+
+    counts = {}
+    counts['users'] = _insert(
+        "INSERT INTO users (id, username, password_hash, is_admin, razao_social, email) VALUES (?, ?, ?, 0, ?, ?)",
+        ((user_id, f"bench{user_id}", password_hash, f"Cliente Sintético {user_id}", f"bench{user_id}@exemplo.com.br") for user_id in user_ids)
+    )
+    counts['client_configs'] = _insert(
+        "INSERT OR REPLACE INTO client_configs (user_id, wordpress_url, instagram_user, instagram_pass, report_email, enable_remix_task, remix_niche_keywords) VALUES (?, ?, ?, ?, ?, 0, ?)",
+        ((user_id, site_url(user_id), f"ig_bench{user_id}", 'senha', f"bench{user_id}@exemplo.com.br", 'urgente, site') for user_id in user_ids)
+    )
+
+    types = [name for name, _ in _EVENT_TYPES]
+    weights = [weight for _, weight in _EVENT_TYPES]
+    counts['event_logs'] = _insert(
+        "INSERT INTO event_logs (timestamp, event_type, message, user_id, severity) VALUES (?, ?, ?, ?, ?)",
+        (
+            (timestamp, event_type, f"Evento sintético {event_type}", rng.choice(user_ids), db.event_severity(event_type))
+            for timestamp, event_type in zip(_timestamps(event_logs, history_days, rng), rng.choices(types, weights, k=event_logs))
+        )
+    )
+    # post_id negativo no histórico, para não colidir com os posts do WordPress falso
+    counts['news_metrics'] = _insert(
+        "INSERT OR IGNORE INTO news_metrics (user_id, post_id, title, link, score, analysis_date) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (user_ids[index % clients], -(index // clients + 1), f"Notícia histórica {index}", f"https://exemplo.com.br/{index}", rng.uniform(0, 120), timestamp)
+            for index, timestamp in enumerate(_timestamps(news_metrics, history_days, rng))
+        )
+    )
+    counts['published_posts'] = _insert(
+        "INSERT OR IGNORE INTO published_posts (user_id, post_id, published_at) VALUES (?, ?, ?)",
+        (
+            (user_ids[index % clients], -(index // clients + 1), timestamp)
+            for index, timestamp in enumerate(_timestamps(published_posts, history_days, rng))
+        )
+    )
+
+    today = datetime.now(timezone.utc).date()
+    counts['instagram_stats'] = _insert(
+        "INSERT OR IGNORE INTO instagram_stats (user_id, followers, following, media_count, collection_date) VALUES (?, ?, ?, ?, ?)",
+        (
+            (user_id, 1000 + day * 3 + rng.randrange(20), 100, day, (today - timedelta(days=stats_days - day)).isoformat())
+            for user_id in user_ids for day in range(stats_days)
+        )
+    )
+    with db.db_connection() as conn:
+        db.rebuild_instagram_stats_rollups(conn)
+        conn.execute("ANALYZE")
+    return counts
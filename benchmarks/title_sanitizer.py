@@ -0,0 +1,60 @@
+# benchmarks/title_sanitizer.py - Compara o limpador de títulos com o BeautifulSoup
+#
+# Uso: python -m benchmarks.title_sanitizer [repetições]
+#
+# A equivalência com o BeautifulSoup em CORPUS é verificada em tests/test_wordpress_client.py.
+
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from wordpress_client import clean_title
+
+# Títulos no formato em que chegam em `title.rendered` da API REST do WordPress
+CORPUS = [
+    "Prefeitura de Cuiabá anuncia novo calendário de vacinação",
+    "Governo do Estado lança programa &#8220;Mais MT&#8221; para pequenos produtores",
+    "Chuvas devem continuar até sexta&#8211;feira, diz Inmet",
+    "Justiça Eleitoral divulga resultado &amp; número de abstenções",
+    "<strong>URGENTE:</strong> ponte é interditada na BR-163",
+    "Festival de inverno em Chapada dos Guimarães começa neste fim de semana&#8230;",
+    "Entrevista: &#8216;A economia vai crescer&#8217;, afirma secretário",
+    "Operação da PF prende 12 em Várzea Grande <em>(vídeo)</em>",
+    "Mercado de trabalho&nbsp;tem melhor resultado desde 2014",
+    "Lista de aprovados no concurso &lt;confira&gt;",
+    "Cuiabá x Flamengo: onde assistir, horário e escalações",
+    "Inflação sobe 0,5% em agosto<br />e acumula alta de 4% no ano",
+    "<a href=\"https://exemplo.com.br/tag/saude\" title=\"Saúde > Vacinas\">Saúde</a>: nova campanha",
+    "Preço do combustível cai pela 3ª semana seguida &#x2014; veja postos",
+    "Caso &quot;Operação Sodoma&quot; volta ao TJ nesta terça",
+    "<!-- destaque -->Trânsito é alterado para obras do BRT",
+    "Receita abre consulta a lote do IR < 2 dias após o prazo",
+    "Título com <span class='cor'>marcação</span> e &eacute;ntidades",
+    "Placar: 1<2 e 3>2 no segundo tempo",
+    "Preço 5 < 10 > 3 hoje",
+    "Taxa <= 5% e >= 2%",
+    "Diferença entre < e >",
+]
+
+def _bs4_title(rendered):
+    return BeautifulSoup(rendered, 'html.parser').get_text()
+
+def run(repeats=200):
+    fast = timeit.timeit(lambda: [clean_title(t) for t in CORPUS], number=repeats)
+    reference = timeit.timeit(lambda: [_bs4_title(t) for t in CORPUS], number=repeats)
+    total = repeats * len(CORPUS)
+    return {
+        'titles': total,
+        'clean_title_us_per_title': fast / total * 1e6,
+        'bs4_us_per_title': reference / total * 1e6,
+        'speedup': reference / fast if fast else float('inf'),
+    }
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    result = run(repeats)
+    print(f"Títulos processados: {result['titles']}")
+    print(f"clean_title:   {result['clean_title_us_per_title']:.2f} µs/título")
+    print(f"BeautifulSoup: {result['bs4_us_per_title']:.2f} µs/título")
+    print(f"Ganho: {result['speedup']:.1f}x")
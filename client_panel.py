@@ -3,6 +3,7 @@
 from flask import Flask, render_template, session, redirect, url_for, request, flash, jsonify
 from datetime import timedelta
 import database as db
+import response_cache
 from datetime import datetime
 from pytz import timezone 
 
@@ -86,7 +87,7 @@ def save_config():
     )
     # --- FIM DA CORREÇÃO ---
 
-    db.log_event('Configurações Salvas', f'Cliente {session["username"]} salvou suas configurações.')
+    db.log_event('Configurações Salvas', f'Cliente {session["username"]} salvou suas configurações.', user_id=user_id)
     flash('Suas configurações foram salvas com sucesso!', 'success')
     
     return redirect (url_for('dashboard'))
@@ -105,35 +106,48 @@ def client_panel_data_api():
         return jsonify({"error": "Não autorizado"}), 401
 
     user_id = session['user_id']
-    username = session['username']
 
-    # Dados para a aba "Desempenho"
-    all_client_logs = db.get_logs_by_username(username)
-    excluded_event_types = ['Novo Cliente Cadastrado', 'Coleta de Stats']
-    performance_logs = [dict(log) for log in all_client_logs if log['event_type'] not in excluded_event_types]
-    
-    # Dados para a aba "Resultados"
-    growth_data = db.get_user_instagram_growth(user_id)
-    summary = db.get_user_performance_summary(user_id)
-
-    # Dados para a aba "Configurações"
-    config = db.get_client_config(user_id)
-
-    # Monta a resposta completa
-    response = {
-        'performance': {
-            'logs': performance_logs
-        },
-        'results': {
-            'summary_cards': summary,
-            'growth_chart': {
-                'labels': [row['collection_date'] for row in growth_data],
-                'data': [row['followers_count'] for row in growth_data]
-            }
-        },
-        'config': dict(config) if config else {}
-    }
-    return jsonify(response)
+    # Intervalo opcional do gráfico de crescimento (?inicio=AAAA-MM-DD&fim=AAAA-MM-DD&pontos=N)
+    try:
+        inicio = request.args.get('inicio')
+        fim = request.args.get('fim')
+        for value in (inicio, fim):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+        pontos = min(max(int(request.args.get('pontos', db.GROWTH_MAX_POINTS)), 3), 1000)
+    except ValueError:
+        return jsonify({"error": "Parâmetros de intervalo inválidos"}), 400
+
+    # O payload só é remontado quando os dados do cliente mudam
+    def build():
+        # Dados para a aba "Desempenho"
+        all_client_logs = db.get_logs_by_user(user_id)
+        excluded_event_types = ['Novo Cliente Cadastrado', 'Coleta de Stats']
+        performance_logs = [dict(log) for log in all_client_logs if log['event_type'] not in excluded_event_types]
+
+        # Dados para a aba "Resultados"
+        growth_data = db.get_user_instagram_growth(user_id, inicio, fim, pontos)
+        summary = db.get_user_performance_summary(user_id)
+
+        # Dados para a aba "Configurações"
+        config = db.get_client_config(user_id)
+
+        # Monta a resposta completa
+        return {
+            'performance': {
+                'logs': performance_logs
+            },
+            'results': {
+                'summary_cards': summary,
+                'growth_chart': {
+                    'labels': [row['collection_date'] for row in growth_data],
+                    'data': [row['followers_count'] for row in growth_data]
+                }
+            },
+            'config': dict(config) if config else {}
+        }
+
+    return response_cache.cached_json('client_panel_data', [user_id], build)
 
 if __name__ == '__main__':
     print("--- Iniciando o Painel do CLIENTE (v3.0) ---")
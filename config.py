@@ -1,5 +1,16 @@
 # ATUAL/config.py - VERSÃO COMPLETA E CORRIGIDA
 
+import os
+
+# Segredos (chaves e tokens) não ficam no repositório: vêm da variável de ambiente
+# ou, se ela não existir, do arquivo indicado
+def _read_secret(env_var, path):
+    value = os.environ.get(env_var)
+    if not value and path and os.path.exists(path):
+        with open(path, encoding='utf-8') as handle:
+            value = handle.read()
+    return value.strip() if value and value.strip() else None
+
 # --- CONFIGURAÇÕES DE AGENDAMENTO ---
 # Horários em que a tarefa de publicação de notícias será executada
 PUBLISH_TIMES = ["09:53", "14:00", "16:42"]
@@ -14,10 +25,114 @@ REMIX_TASK_TIMES = ["14:10", "16:28"]
 TIMEZONE = "America/Cuiaba"
 
 # --- CONFIGURAÇÕES DE COMPORTAMENTO ---
-# Pausa mínima e máxima (em minutos) entre as publicações no Instagram
+# Pausa mínima e máxima (em minutos) entre as publicações de uma mesma conta do Instagram
 PAUSE_MIN_MINUTES = 5
 PAUSE_MAX_MINUTES = 15
 
+# --- LIMITES DE PUBLICAÇÃO POR CONTA DO INSTAGRAM ---
+# Cotas por conta, guardadas no banco (valem entre reinícios e entre processos).
+# A cota por hora funciona como um token bucket; a diária é reiniciada à meia-noite UTC.
+INSTAGRAM_POSTS_PER_HOUR = 4
+INSTAGRAM_POSTS_PER_DAY = 20
+# Pausa (em segundos) aplicada à conta depois de uma falha de publicação
+PUBLISH_FAILURE_PAUSE_SECONDS = 60
+
+# --- CONFIGURAÇÕES DE CONCORRÊNCIA ---
+# Número máximo de clientes em andamento ao mesmo tempo na tarefa de publicação.
+# Os clientes rodam como corrotinas no event loop do agente, sem uma thread cada.
+MAX_CONCURRENT_CLIENTS = 64
+
+# Threads do executor usado pelo event loop para as bibliotecas bloqueantes
+# (SQLite, instagrapi). Limita o uso de threads independentemente do número de clientes.
+ASYNC_BLOCKING_WORKERS = 8
+
+# Tempo máximo (em minutos) de uma execução da tarefa de publicação.
+# Ao atingir o limite, nenhum cliente inicia novas publicações nesta rodada.
+PUBLISH_RUN_DEADLINE_MINUTES = 150
+
+# Contas do Instagram consultadas ao mesmo tempo na coleta noturna de estatísticas
+STATS_COLLECTION_WORKERS = 8
+
+# --- CONFIGURAÇÕES DE MÉTRICAS ---
+# Porta do servidor lateral de métricas do agente (formato Prometheus, em /metrics).
+# None desativa; o painel admin expõe as próprias métricas em /metrics.
+AGENT_METRICS_PORT = None
+# Token exigido pelos endpoints /metrics (cabeçalho "Authorization: Bearer <token>"),
+# lido da variável de ambiente NEWSBOT_METRICS_TOKEN ou do arquivo indicado em
+# NEWSBOT_METRICS_TOKEN_FILE. Sem token, o /metrics do painel só responde a
+# administradores logados e o servidor lateral do agente não é iniciado.
+METRICS_TOKEN = _read_secret('NEWSBOT_METRICS_TOKEN', os.environ.get('NEWSBOT_METRICS_TOKEN_FILE'))
+
+# --- CONFIGURAÇÕES DA COLETA DO WORDPRESS ---
+# Tempo (em minutos) em que a coleta de um site serve a todos os clientes que o
+# usam, nesta e nas outras instâncias: os jobs de uma mesma rodada buscam cada
+# site uma única vez. Deve ser menor que o intervalo entre as rodadas de publicação.
+WORDPRESS_FEED_REUSE_MINUTES = 15
+
+# --- CONFIGURAÇÕES DE NOTÍCIAS DUPLICADAS ---
+# Fração mínima de termos em comum (Jaccard) entre dois títulos para tratá-los
+# como a mesma notícia. None desativa a detecção de quase-duplicatas (só cópias exatas).
+NEAR_DUPLICATE_MIN_SIMILARITY = 0.8
+# Distância máxima (em horas) entre as datas de publicação de duas notícias para
+# tratá-las como a mesma. Títulos recorrentes em dias diferentes ficam distintos.
+DUPLICATE_STORY_WINDOW_HOURS = 12
+# Impede que a mesma notícia saia duas vezes na mesma conta do Instagram,
+# mesmo com outro post ID ou vinda do site de outro cliente
+BLOCK_DUPLICATE_STORIES_PER_ACCOUNT = True
+
+# --- CONFIGURAÇÕES DA FILA DE TAREFAS ---
+# Threads de worker por processo do agente
+JOB_WORKER_CONCURRENCY = 8
+# Jobs assíncronos (publicação) em andamento por processo. Eles esperam as pausas
+# entre publicações no event loop, sem ocupar uma thread de worker.
+JOB_MAX_ASYNC_JOBS = 512
+# Duração do lease de um job em execução; renovado automaticamente enquanto o
+# worker estiver vivo. Se o processo cair, o job volta para a fila ao vencer.
+JOB_LEASE_SECONDS = 300
+# Tentativas por job e espera base entre elas (dobra a cada nova falha)
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF_SECONDS = 60
+# Intervalo (em segundos) entre consultas à fila quando não há jobs
+JOB_POLL_SECONDS = 2
+
+# --- CONFIGURAÇÕES DE SHARDS (VÁRIAS INSTÂNCIAS DO AGENTE) ---
+# Com shards ativos, cada instância só executa os jobs dos clientes da sua partição.
+SHARDING_ENABLED = False
+# Intervalo do heartbeat de cada instância e tempo sem heartbeat para
+# considerá-la morta (seus clientes são redistribuídos entre as demais)
+SHARD_HEARTBEAT_SECONDS = 15
+SHARD_INSTANCE_TTL_SECONDS = 60
+
+
+# --- CONFIGURAÇÕES DO CACHE DOS PAINÉIS ---
+# Respostas das APIs dos painéis ficam em cache por usuário e endpoint até que
+# uma escrita no banco mude a versão dos dados (ou até expirar o TTL).
+RESPONSE_CACHE_TTL_SECONDS = 300
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+# Backend compartilhado opcional entre vários processos dos painéis
+# (ex.: "redis://localhost:6379/0"; requer o pacote redis). None = só em memória.
+RESPONSE_CACHE_URL = None
+
+
+# --- CONFIGURAÇÕES DE SESSÃO DO INSTAGRAM ---
+# Chave Fernet usada para criptografar as sessões do Instagram salvas no banco.
+# Não fica no repositório: vem da variável de ambiente NEWSBOT_INSTAGRAM_SESSION_KEY
+# ou do arquivo indicado em NEWSBOT_INSTAGRAM_SESSION_KEY_FILE (padrão abaixo).
+# Gere uma com: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+# Sem chave, as sessões não são salvas e o agente faz login completo a cada execução.
+# Trocar a chave invalida as sessões salvas (o agente volta a fazer login completo).
+# A chave fixa usada antes desta configuração circulou fora do servidor e deve ser
+# tratada como comprometida: gere uma chave nova em cada instalação, nunca a antiga,
+# e apague a tabela instagram_sessions se ela ainda tiver sessões gravadas com ela.
+INSTAGRAM_SESSION_KEY_FILE = os.environ.get('NEWSBOT_INSTAGRAM_SESSION_KEY_FILE', 'instagram_session.key')
+
+INSTAGRAM_SESSION_KEY = _read_secret('NEWSBOT_INSTAGRAM_SESSION_KEY', INSTAGRAM_SESSION_KEY_FILE)
+
+# Quantidade de sessões mantidas em memória e intervalo (em minutos) para
+# revalidar uma sessão antes de reutilizá-la
+INSTAGRAM_SESSION_CACHE_SIZE = 64
+INSTAGRAM_SESSION_REVALIDATE_MINUTES = 30
+
 
 # --- CONFIGURAÇÕES DE EMAIL DO ADMINISTRADOR ---
 # Usado para enviar os relatórios para os clientes
@@ -27,6 +142,12 @@ EMAIL_PASSWORD = "zuda xkhb msfp xief"
 
 # --- CONFIGURAÇÕES DO SERVIDOR DE EMAIL (SMTP) ---
 # Estas variáveis estavam faltando e causando o erro
-EMAIL_HOST = "llconsultoriahora@gmail.com"
+EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
+EMAIL_USE_TLS = True
+
+# Conexões SMTP autenticadas abertas ao mesmo tempo no envio em lote dos relatórios
+EMAIL_MAX_CONNECTIONS = 2
+# Timeout (em segundos) das operações com o servidor SMTP
+EMAIL_TIMEOUT = 30
 EMAIL_SUBJECT = "lconsultoriahora@gmail.com"
\ No newline at end of file
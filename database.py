@@ -1,134 +1,713 @@
 # ATUAL/database.py - VERSÃO COMPLETA E FINAL
 
 import sqlite3
+import re
+import json
+import base64
+import time
+import threading
+import queue
+import atexit
+import inspect
+from datetime import datetime, timezone, timedelta
+from contextlib import contextmanager
 import bcrypt
 
+import metrics
+
 DATABASE_NAME = "agente.db"
 
+# --- AJUSTES DE CONEXÃO ---
+# Quantidade máxima de conexões ociosas mantidas abertas pelo pool
+DB_POOL_SIZE = 8
+# Tempo (em milissegundos) que uma conexão espera por um lock antes de falhar
+DB_BUSY_TIMEOUT_MS = 5000
+# Tamanho do cache de páginas (valor negativo = KiB) e da área mapeada em memória
+DB_CACHE_SIZE_KIB = 20000
+DB_MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+# --- AJUSTES DO LOG DE EVENTOS ---
+# Os eventos são acumulados em memória e gravados em lote quando a fila atinge
+# LOG_BATCH_SIZE itens ou quando LOG_FLUSH_INTERVAL_SECONDS se passam.
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL_SECONDS = 2.0
+# Um lote que falha é regravado uma vez depois dessa pausa antes de ser descartado
+LOG_RETRY_DELAY_SECONDS = 0.5
+
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE_NAME)
+    """Abre uma nova conexão já configurada com WAL e os pragmas de desempenho."""
+    conn = sqlite3.connect(DATABASE_NAME, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_BYTES}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
+class ConnectionPool:
+    """
+    Pool de conexões SQLite compartilhado entre o agente e os painéis.
+    As conexões ficam abertas entre as chamadas, evitando reconectar a cada consulta.
+    """
+
+    def __init__(self, max_size=DB_POOL_SIZE):
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._local = threading.local()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return get_db_connection()
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Entrega uma conexão do pool dentro de uma transação: faz commit ao sair
+        normalmente e rollback em caso de erro. Chamadas aninhadas na mesma
+        thread reutilizam a conexão (e a transação) já aberta.
+        """
+        current = getattr(self._local, 'conn', None)
+        if current is not None:
+            yield current
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def db_connection():
+    """Atalho para `get_pool().connection()`, usado por todas as funções deste módulo."""
+    return get_pool().connection()
+
 def create_tables():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            is_admin BOOLEAN NOT NULL DEFAULT 0,
-            status TEXT NOT NULL DEFAULT 'ativo',
-            razao_social TEXT,
-            cnpj TEXT,
-            email TEXT,
-            telefone TEXT,
-            responsavel TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS client_configs (
-            user_id INTEGER PRIMARY KEY,
-            wordpress_url TEXT,
-            instagram_user TEXT,
-            instagram_pass TEXT,
-            report_email TEXT,
-            enable_remix_task BOOLEAN DEFAULT 0,
-            remix_niche_keywords TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS published_posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            post_id INTEGER NOT NULL,
-            published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, post_id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS event_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            event_type TEXT,
-            message TEXT
-        )
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                is_admin BOOLEAN NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'ativo',
+                razao_social TEXT,
+                cnpj TEXT,
+                email TEXT,
+                telefone TEXT,
+                responsavel TEXT
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS client_configs (
+                user_id INTEGER PRIMARY KEY,
+                wordpress_url TEXT,
+                instagram_user TEXT,
+                instagram_pass TEXT,
+                report_email TEXT,
+                enable_remix_task BOOLEAN DEFAULT 0,
+                remix_niche_keywords TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS published_posts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                post_id INTEGER NOT NULL,
+                published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, post_id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                event_type TEXT,
+                message TEXT,
+                user_id INTEGER,
+                severity TEXT NOT NULL DEFAULT 'info'
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS news_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                post_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                title TEXT,
+                link TEXT,
+                score REAL,
+                analysis_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, post_id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS instagram_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                followers INTEGER,
+                following INTEGER,
+                media_count INTEGER,
+                collection_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, collection_date),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS remix_topics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                is_used BOOLEAN DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wordpress_fetch_cache (
+                site_url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                last_post_date TEXT,
+                posts_json TEXT NOT NULL DEFAULT '[]',
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Quem está buscando cada site agora (uma coleta por site entre todas as instâncias)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wordpress_fetch_leases (
+                site_url TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS instagram_sessions (
+                instagram_user TEXT PRIMARY KEY,
+                settings_encrypted TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_report_summary (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                news_count INTEGER NOT NULL DEFAULT 0,
+                posts_published INTEGER NOT NULL DEFAULT 0,
+                score_sum REAL NOT NULL DEFAULT 0,
+                score_min REAL,
+                score_max REAL,
+                score_histogram TEXT NOT NULL DEFAULT '[]',
+                top_news TEXT NOT NULL DEFAULT '[]',
+                PRIMARY KEY (user_id, day)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task TEXT NOT NULL,
+                client_id INTEGER,
+                state TEXT NOT NULL DEFAULT 'pendente',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                lease_owner TEXT,
+                lease_expires_at TIMESTAMP,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agent_instances (
+                instance_id TEXT PRIMARY KEY,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                heartbeat_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Agregados semanais e mensais de instagram_stats (a série diária é a própria tabela)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS instagram_stats_rollups (
+                user_id INTEGER NOT NULL,
+                period TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                followers_min INTEGER,
+                followers_max INTEGER,
+                followers_last INTEGER,
+                following_last INTEGER,
+                media_count_last INTEGER,
+                samples INTEGER NOT NULL,
+                last_date TEXT NOT NULL,
+                PRIMARY KEY (user_id, period, period_start),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Versão dos dados por escopo ('global' e 'cliente:<id>'), usada pelo cache dos painéis
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                scope TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+
+        # Índice de impressões digitais das notícias (ver fingerprints.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS news_fingerprints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title_hash TEXT NOT NULL,
+                canonical_link TEXT,
+                title TEXT,
+                artifacts TEXT NOT NULL DEFAULT '{}',
+                story_date TEXT NOT NULL,
+                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Faixas MinHash de cada impressão, para achar quase-duplicatas sem varrer o índice
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS news_fingerprint_bands (
+                band_key INTEGER NOT NULL,
+                fingerprint_id INTEGER NOT NULL,
+                PRIMARY KEY (band_key, fingerprint_id),
+                FOREIGN KEY (fingerprint_id) REFERENCES news_fingerprints (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS instagram_rate_limits (
+                instagram_user TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                refreshed_at REAL NOT NULL,
+                day TEXT,
+                day_count INTEGER NOT NULL DEFAULT 0,
+                next_allowed_at REAL NOT NULL DEFAULT 0
+            )
+        ''')
+
+        migrate_schema(conn)
+
+SCHEMA_VERSION = 6
+
+def _column_names(conn, table):
+    return {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def event_severity(event_type):
+    """Normaliza o tipo do evento em uma severidade ('erro' ou 'info')."""
+    return 'erro' if event_type and event_type.startswith('Erro') else 'info'
+
+# Padrões de mensagem que citam o cliente, usados para preencher `user_id`
+# nos logs gravados antes da coluna existir. O nome do cliente pode ter espaços
+# ('CLAUDIO DA HORA'), então o padrão é montado com os usuários cadastrados.
+_LEGACY_USERNAME_TEMPLATE = r"(?:para o cliente|do cliente|o cliente|para|Cliente) ({})(?=[.:]?$|[.:] | em | salvou )"
+_LEGACY_USER_ID_PATTERN = re.compile(r"(?:cliente ID|Cliente com ID) (\d+)")
+
+def _backfill_event_log_users(conn):
+    user_ids = {row['username']: row['id'] for row in conn.execute("SELECT id, username FROM users")}
+    if not user_ids:
+        username_pattern = None
+    else:
+        # Nomes mais longos primeiro: 'ANA MARIA' antes de 'ANA'
+        names = sorted(user_ids, key=len, reverse=True)
+        username_pattern = re.compile(_LEGACY_USERNAME_TEMPLATE.format('|'.join(re.escape(name) for name in names)))
+    updates = []
+    for row in conn.execute("SELECT id, event_type, message FROM event_logs WHERE user_id IS NULL"):
+        message = row['message'] or ''
+        user_id = None
+        match = _LEGACY_USER_ID_PATTERN.search(message)
+        if match:
+            user_id = int(match.group(1))
+        elif username_pattern:
+            # O cliente costuma ser citado no fim da mensagem, depois do título da notícia
+            candidates = username_pattern.findall(message)
+            if candidates:
+                user_id = user_ids[candidates[-1]]
+        updates.append((user_id, event_severity(row['event_type']), row['id']))
+    conn.executemany("UPDATE event_logs SET user_id = ?, severity = ? WHERE id = ?", updates)
+
+def migrate_schema(conn):
+    """
+    Aplica as migrações pendentes, controladas por `PRAGMA user_version`.
+    Cada migração roda uma única vez por banco.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        # Logs estruturados: cliente e severidade em colunas próprias
+        columns = _column_names(conn, 'event_logs')
+        if 'user_id' not in columns:
+            conn.execute("ALTER TABLE event_logs ADD COLUMN user_id INTEGER")
+        if 'severity' not in columns:
+            conn.execute("ALTER TABLE event_logs ADD COLUMN severity TEXT NOT NULL DEFAULT 'info'")
+        _backfill_event_log_users(conn)
+
+    if version < 2:
+        # Resumo diário materializado a partir do histórico já existente
+        rebuild_daily_report_summary(conn)
+
+    if version < 3:
+        # Agregados semanais e mensais a partir das estatísticas já coletadas
+        rebuild_instagram_stats_rollups(conn)
+
+    if version < 4:
+        # Impressão digital das notícias analisadas e publicadas (sem preenchimento
+        # retroativo: o histórico anterior continua identificado só pelo post ID)
+        for table in ('news_metrics', 'published_posts'):
+            if 'fingerprint_id' not in _column_names(conn, table):
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN fingerprint_id INTEGER")
+
+    if version < 5:
+        # O cache da coleta passou a ser por site (wordpress_client.site_key), e não
+        # pela URL de cada cliente; as linhas antigas são refeitas na próxima coleta
+        conn.execute("DELETE FROM wordpress_fetch_cache")
+
+    if version < 6 and 'story_date' not in _column_names(conn, 'news_fingerprints'):
+        # Impressões só valem perto da data da notícia: o título deixa de ser único
+        # e cada linha guarda a data de publicação (as antigas usam first_seen)
+        conn.execute('''
+            CREATE TABLE news_fingerprints_v6 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title_hash TEXT NOT NULL,
+                canonical_link TEXT,
+                title TEXT,
+                artifacts TEXT NOT NULL DEFAULT '{}',
+                story_date TEXT NOT NULL,
+                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO news_fingerprints_v6 (id, title_hash, canonical_link, title, artifacts, story_date, first_seen)
+            SELECT id, title_hash, canonical_link, title, artifacts, first_seen, first_seen FROM news_fingerprints
+        ''')
+        conn.execute("DROP TABLE news_fingerprints")
+        conn.execute("ALTER TABLE news_fingerprints_v6 RENAME TO news_fingerprints")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_logs_user_type_ts ON event_logs (user_id, event_type, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_logs_user_ts ON event_logs (user_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_logs_severity_ts ON event_logs (severity, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_logs_type_ts ON event_logs (event_type, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_news_metrics_user_date ON news_metrics (user_id, analysis_date)")
+    # Paginação por cursor: (timestamp, id) em ordem decrescente (o id vem do rowid do índice)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_logs_ts ON event_logs (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_news_metrics_date ON news_metrics (analysis_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_news_metrics_user_fingerprint ON news_metrics (user_id, fingerprint_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_published_posts_fingerprint ON published_posts (fingerprint_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_news_fingerprints_title_date ON news_fingerprints (title_hash, story_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_news_fingerprints_link_date ON news_fingerprints (canonical_link, story_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_news_fingerprints_date ON news_fingerprints (story_date)")
+    # instagram_stats já tem índice em (user_id, collection_date) pelo UNIQUE da tabela
+    # No máximo um job ativo (pendente ou executando) por tarefa e cliente
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_task_client
+        ON jobs (task, IFNULL(client_id, -1)) WHERE state IN ('pendente', 'executando')
     ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS news_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            post_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            title TEXT,
-            link TEXT,
-            score REAL,
-            analysis_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, post_id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state_run_after ON jobs (state, run_after)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_client_state ON jobs (client_id, state)")
+
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+# --- RESUMO DIÁRIO MATERIALIZADO ---
+# Uma linha por cliente e por dia (UTC), atualizada a cada add_news_metric e a
+# cada publicação. O relatório por email e a aba "Resultados" leem só essas linhas.
+
+# Quantidade de notícias guardadas no top do dia
+REPORT_TOP_N = 3
+# Limites das faixas do histograma de scores: [0, 10), [10, 25), ..., [100, ∞)
+SCORE_HISTOGRAM_BOUNDS = (10, 25, 50, 100)
+
+def _score_bucket(score):
+    for index, bound in enumerate(SCORE_HISTOGRAM_BOUNDS):
+        if score < bound:
+            return index
+    return len(SCORE_HISTOGRAM_BOUNDS)
+
+def _add_metric_to_daily_summary(conn, user_id, day, post_id, title, link, score):
+    score = float(score or 0.0)
+    row = conn.execute(
+        "SELECT * FROM daily_report_summary WHERE user_id = ? AND day = ?", (user_id, day)
+    ).fetchone()
+
+    histogram = json.loads(row['score_histogram']) if row else []
+    histogram += [0] * (len(SCORE_HISTOGRAM_BOUNDS) + 1 - len(histogram))
+    histogram[_score_bucket(score)] += 1
+
+    top_news = json.loads(row['top_news']) if row else []
+    top_news.append({'post_id': post_id, 'title': title, 'link': link, 'score': score})
+    top_news = sorted(top_news, key=lambda n: n['score'], reverse=True)[:REPORT_TOP_N]
+
+    conn.execute(
+        """
+        INSERT INTO daily_report_summary (user_id, day, news_count, score_sum, score_min, score_max, score_histogram, top_news)
+        VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            news_count = news_count + 1,
+            score_sum = score_sum + excluded.score_sum,
+            score_min = min(coalesce(score_min, excluded.score_min), excluded.score_min),
+            score_max = max(coalesce(score_max, excluded.score_max), excluded.score_max),
+            score_histogram = excluded.score_histogram,
+            top_news = excluded.top_news
+        """,
+        (user_id, day, score, score, score, json.dumps(histogram), json.dumps(top_news, ensure_ascii=False))
+    )
+
+def _add_posts_to_daily_summary(conn, user_id, day, amount):
+    conn.execute(
+        """
+        INSERT INTO daily_report_summary (user_id, day, posts_published) VALUES (?, ?, max(?, 0))
+        ON CONFLICT (user_id, day) DO UPDATE SET posts_published = max(posts_published + ?, 0)
+        """,
+        (user_id, day, amount, amount)
+    )
+
+def rebuild_daily_report_summary(conn):
+    """Recalcula todo o resumo diário a partir de news_metrics e published_posts."""
+    conn.execute("DELETE FROM daily_report_summary")
+    metrics = conn.execute(
+        "SELECT user_id, date(analysis_date) AS day, post_id, title, link, score FROM news_metrics ORDER BY id"
+    ).fetchall()
+    for row in metrics:
+        _add_metric_to_daily_summary(conn, row['user_id'], row['day'], row['post_id'], row['title'], row['link'], row['score'])
+    posts = conn.execute(
+        "SELECT user_id, date(published_at) AS day, COUNT(*) AS total FROM published_posts GROUP BY user_id, day"
+    ).fetchall()
+    for row in posts:
+        _add_posts_to_daily_summary(conn, row['user_id'], row['day'], row['total'])
+
+# --- SÉRIE TEMPORAL DO INSTAGRAM ---
+# instagram_stats guarda um ponto por cliente e por dia. instagram_stats_rollups
+# guarda os agregados por semana (começando na segunda) e por mês, recalculados
+# só para o período afetado a cada gravação. O gráfico de crescimento lê o nível
+# mais grosso que ainda cobre o intervalo e reduz o resultado a GROWTH_MAX_POINTS.
+
+# Quantidade máxima de pontos devolvidos para o gráfico de crescimento
+GROWTH_MAX_POINTS = 120
+
+_ROLLUP_PERIOD_EXPRESSIONS = {
+    'semana': "date(collection_date, 'weekday 0', '-6 days')",
+    'mes': "date(collection_date, 'start of month')",
+}
+
+def _rollup_period_bounds(period, day):
+    """Primeiro dia do período que contém `day` e primeiro dia do período seguinte."""
+    if period == 'semana':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def _refresh_instagram_rollups(conn, period, user_ids=None, start=None, end=None):
+    """Recalcula os agregados de `period`; sem filtros, recalcula o histórico inteiro."""
+    filters, params = [], []
+    if user_ids is not None:
+        filters.append(f"user_id IN ({','.join('?' * len(user_ids))})")
+        params.extend(user_ids)
+    if start is not None:
+        filters.append("collection_date >= ? AND collection_date < ?")
+        params.extend([start.isoformat(), end.isoformat()])
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    conn.execute(
+        f"""
+        INSERT OR REPLACE INTO instagram_stats_rollups
+            (user_id, period, period_start, followers_min, followers_max,
+             followers_last, following_last, media_count_last, samples, last_date)
+        SELECT user_id, ?, period_start, followers_min, followers_max,
+               followers, following, media_count, samples, day
+        FROM (
+            SELECT user_id, followers, following, media_count,
+                   date(collection_date) AS day,
+                   {_ROLLUP_PERIOD_EXPRESSIONS[period]} AS period_start,
+                   MIN(followers) OVER period_window AS followers_min,
+                   MAX(followers) OVER period_window AS followers_max,
+                   COUNT(*) OVER period_window AS samples,
+                   ROW_NUMBER() OVER (PARTITION BY user_id, {_ROLLUP_PERIOD_EXPRESSIONS[period]}
+                                      ORDER BY collection_date DESC) AS position
+            FROM instagram_stats
+            {where}
+            WINDOW period_window AS (PARTITION BY user_id, {_ROLLUP_PERIOD_EXPRESSIONS[period]})
         )
-    ''')
+        WHERE position = 1
+        """,
+        [period] + params
+    )
 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS instagram_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            followers INTEGER,
-            following INTEGER,
-            media_count INTEGER,
-            collection_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, collection_date),
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+def rebuild_instagram_stats_rollups(conn):
+    """Recalcula todos os agregados semanais e mensais a partir de instagram_stats."""
+    conn.execute("DELETE FROM instagram_stats_rollups")
+    for period in _ROLLUP_PERIOD_EXPRESSIONS:
+        _refresh_instagram_rollups(conn, period)
+
+def save_instagram_stats_batch(day, stats_rows):
+    """
+    Grava as estatísticas do dia em uma única transação.
+    `stats_rows` é uma lista de (user_id, followers, following, media_count);
+    a chave é (user_id, dia), então reexecutar a coleta no mesmo dia só atualiza os valores.
+    """
+    if not stats_rows:
+        return
+    user_ids = sorted({row[0] for row in stats_rows})
+    collection_day = datetime.strptime(day, '%Y-%m-%d').date()
+    with db_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO instagram_stats (user_id, followers, following, media_count, collection_date)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, collection_date) DO UPDATE SET
+                followers = excluded.followers,
+                following = excluded.following,
+                media_count = excluded.media_count
+            """,
+            [(user_id, followers, following, media_count, day) for user_id, followers, following, media_count in stats_rows]
         )
-    ''')
+        # Só a semana e o mês do dia gravado mudam
+        for period in _ROLLUP_PERIOD_EXPRESSIONS:
+            start, end = _rollup_period_bounds(period, collection_day)
+            _refresh_instagram_rollups(conn, period, user_ids, start, end)
+        touch_cache_versions(conn, cache_scopes_for_users(user_ids))
 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS remix_topics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic TEXT NOT NULL,
-            is_used BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+def _downsample_lttb(points, max_points):
+    """
+    Reduz a série [(x, y, ...), ...] a `max_points` pontos pelo algoritmo
+    Largest-Triangle-Three-Buckets, que preserva picos e vales do gráfico.
+    Só os dois primeiros campos entram no cálculo; os demais acompanham o ponto.
+    """
+    if max_points >= len(points) or max_points < 3:
+        return points
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (max_points - 2)
+    previous = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[end:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+        ax, ay = points[previous][0], points[previous][1]
+        chosen = max(
+            range(start, end),
+            key=lambda i: abs((ax - avg_x) * (points[i][1] - ay) - (ax - points[i][0]) * (avg_y - ay))
         )
-    ''')
-    
-    conn.commit()
-    conn.close()
+        sampled.append(points[chosen])
+        previous = chosen
+    sampled.append(points[-1])
+    return sampled
+
+def get_user_instagram_growth(user_id, start=None, end=None, max_points=GROWTH_MAX_POINTS):
+    """
+    Série de seguidores do cliente entre `start` e `end` (datas 'AAAA-MM-DD', inclusivas),
+    com no máximo `max_points` pontos. Usa a série diária, semanal ou mensal conforme
+    o tamanho do intervalo. Retorna dicts com 'collection_date' e 'followers_count'.
+    """
+    with db_connection() as conn:
+        if start is None or end is None:
+            bounds = conn.execute(
+                "SELECT date(MIN(collection_date)) AS first, date(MAX(collection_date)) AS last FROM instagram_stats WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+            if bounds['first'] is None:
+                return []
+            start = start or bounds['first']
+            end = end or bounds['last']
+
+        first_day = datetime.strptime(start, '%Y-%m-%d').date()
+        last_day = datetime.strptime(end, '%Y-%m-%d').date()
+        span_days = (last_day - first_day).days + 1
+        range_end = (last_day + timedelta(days=1)).isoformat()
+
+        if span_days <= max_points:
+            rows = conn.execute(
+                """
+                SELECT date(collection_date) AS day, followers FROM instagram_stats
+                WHERE user_id = ? AND collection_date >= ? AND collection_date < ?
+                ORDER BY collection_date
+                """,
+                (user_id, start, range_end)
+            ).fetchall()
+        else:
+            period = 'semana' if span_days / 7 <= max_points else 'mes'
+            rows = conn.execute(
+                """
+                SELECT last_date AS day, followers_last AS followers FROM instagram_stats_rollups
+                WHERE user_id = ? AND period = ? AND last_date >= ? AND last_date < ?
+                ORDER BY period_start
+                """,
+                (user_id, period, start, range_end)
+            ).fetchall()
+
+    points = [(datetime.strptime(row['day'], '%Y-%m-%d').toordinal(), row['followers'] or 0, row['day']) for row in rows]
+    return [{'collection_date': day, 'followers_count': followers} for _, followers, day in _downsample_lttb(points, max_points)]
 
 def add_user(username, password, is_admin=False, **kwargs):
-    conn = get_db_connection()
+    password_bytes = password.encode('utf-8')
+    hashed_password = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
+    hashed_password_str = hashed_password.decode('utf-8')
     try:
-        password_bytes = password.encode('utf-8')
-        hashed_password = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
-        hashed_password_str = hashed_password.decode('utf-8')
-        
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (username, password_hash, is_admin, razao_social, cnpj, email, telefone, responsavel) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (username, hashed_password_str, is_admin, kwargs.get('razao_social'), kwargs.get('cnpj'), kwargs.get('email'), kwargs.get('telefone'), kwargs.get('responsavel'))
-        )
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT INTO users (username, password_hash, is_admin, razao_social, cnpj, email, telefone, responsavel) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (username, hashed_password_str, is_admin, kwargs.get('razao_social'), kwargs.get('cnpj'), kwargs.get('email'), kwargs.get('telefone'), kwargs.get('responsavel'))
+            )
+            touch_cache_versions(conn, [CACHE_SCOPE_GLOBAL])
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def get_user(username):
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-    conn.close()
-    return user
+    with db_connection() as conn:
+        return conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
 
 def get_user_by_id(user_id):
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
-    return user
+    with db_connection() as conn:
+        return conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
 
 def check_password(password, hashed_password_from_db):
     password_bytes = password.encode('utf-8')
@@ -136,111 +715,255 @@ def check_password(password, hashed_password_from_db):
     return bcrypt.checkpw(password_bytes, hashed_password_bytes)
 
 def get_all_clients():
-    conn = get_db_connection()
-    clients = conn.execute('SELECT * FROM users WHERE is_admin = 0 ORDER BY id').fetchall()
-    conn.close()
-    return clients
+    with db_connection() as conn:
+        return conn.execute('SELECT * FROM users WHERE is_admin = 0 ORDER BY id').fetchall()
 
 def update_user_status(user_id, new_status):
-    conn = get_db_connection()
-    conn.execute('UPDATE users SET status = ? WHERE id = ?', (new_status, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute('UPDATE users SET status = ? WHERE id = ?', (new_status, user_id))
+        touch_cache_versions(conn, cache_scopes_for_users([user_id]))
 
 def delete_user(user_id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        # O gráfico por cliente do painel admin junta os eventos aos usuários
+        touch_cache_versions(conn, cache_scopes_for_users([user_id], include_global=True))
 
 def save_client_config(user_id, wordpress_url, instagram_user, instagram_pass, report_email, enable_remix_task, remix_niche_keywords):
-    conn = get_db_connection()
-    conn.execute(
-        "INSERT OR REPLACE INTO client_configs (user_id, wordpress_url, instagram_user, instagram_pass, report_email, enable_remix_task, remix_niche_keywords) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (user_id, wordpress_url, instagram_user, instagram_pass, report_email, enable_remix_task, remix_niche_keywords)
-    )
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO client_configs (user_id, wordpress_url, instagram_user, instagram_pass, report_email, enable_remix_task, remix_niche_keywords) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, wordpress_url, instagram_user, instagram_pass, report_email, enable_remix_task, remix_niche_keywords)
+        )
+        touch_cache_versions(conn, cache_scopes_for_users([user_id]))
 
 def get_client_config(user_id):
-    conn = get_db_connection()
-    config = conn.execute('SELECT * FROM client_configs WHERE user_id = ?', (user_id,)).fetchone()
-    conn.close()
-    return config
+    with db_connection() as conn:
+        return conn.execute('SELECT * FROM client_configs WHERE user_id = ?', (user_id,)).fetchone()
+
+def get_active_client_config(user_id):
+    query = """
+        SELECT u.id, u.username, c.wordpress_url, c.instagram_user, c.instagram_pass, c.report_email, c.enable_remix_task, c.remix_niche_keywords
+        FROM users u
+        JOIN client_configs c ON u.id = c.user_id
+        WHERE u.status = 'ativo' AND u.id = ?
+    """
+    with db_connection() as conn:
+        return conn.execute(query, (user_id,)).fetchone()
 
 def get_all_active_client_configs():
-    conn = get_db_connection()
     query = """
         SELECT u.id, u.username, c.wordpress_url, c.instagram_user, c.instagram_pass, c.report_email, c.enable_remix_task, c.remix_niche_keywords
         FROM users u
         JOIN client_configs c ON u.id = c.user_id
         WHERE u.status = 'ativo'
     """
-    clients = conn.execute(query).fetchall()
-    conn.close()
-    return clients
-
-def log_event(event_type, message):
-    conn = get_db_connection()
-    conn.execute("INSERT INTO event_logs (event_type, message) VALUES (?, ?)", (event_type, message))
-    conn.commit()
-    conn.close()
-
-def get_all_logs():
-    conn = get_db_connection()
-    logs = conn.execute('SELECT * FROM event_logs ORDER BY timestamp DESC').fetchall()
-    conn.close()
-    return logs
-
-def add_news_metric(user_id, post_id, title, link, score):
-    conn = get_db_connection()
-    conn.execute(
-        "INSERT OR IGNORE INTO news_metrics (user_id, post_id, title, link, score) VALUES (?, ?, ?, ?, ?)",
-        (user_id, post_id, title, link, score)
-    )
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        return conn.execute(query).fetchall()
+
+class EventLogWriter:
+    """
+    Grava os eventos de log em segundo plano. `log_event` apenas enfileira a
+    linha; uma thread dedicada insere os lotes com `executemany` em uma única
+    transação, sem que quem registrou o evento espere pelo disco.
+    """
+
+    def __init__(self, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL_SECONDS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._drain_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, row):
+        if self._thread is None:
+            self._start()
+        self._queue.put(row)
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            # Acorda quando a fila enche ou, no máximo, a cada flush_interval
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _write(self, batch):
+        try:
+            self._insert(batch)
+            return
+        except Exception as e:
+            print(f"[ERRO LOG] Falha ao gravar {len(batch)} evento(s) de log, nova tentativa: {e}")
+        time.sleep(LOG_RETRY_DELAY_SECONDS)
+        try:
+            self._insert(batch)
+        except Exception as e:
+            # Não dá para registrar pelo próprio log_event: o lote é descartado e contado na métrica
+            metrics.LOG_EVENTS_DROPPED.inc(len(batch))
+            print(f"[ERRO LOG] {len(batch)} evento(s) de log descartado(s) após nova falha: {e}")
+
+    def _insert(self, batch):
+        with db_connection() as conn:
+            conn.executemany(
+                "INSERT INTO event_logs (timestamp, event_type, message, user_id, severity) VALUES (?, ?, ?, ?, ?)", batch
+            )
+            # O escopo global só muda com os eventos que entram nos gráficos do admin
+            touch_cache_versions(conn, cache_scopes_for_users(
+                {entry[3] for entry in batch},
+                include_global=any(_event_changes_global_charts(entry[1], entry[4]) for entry in batch)
+            ))
+
+    def flush(self):
+        """
+        Grava, na thread atual, tudo o que estiver na fila. Se a thread de
+        gravação estiver no meio de um lote, espera esse lote terminar.
+        """
+        with self._drain_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                self._write(batch)
+
+_log_writer = EventLogWriter()
 
-def get_all_news_metrics():
-    conn = get_db_connection()
-    metrics = conn.execute('SELECT * FROM news_metrics ORDER BY analysis_date DESC').fetchall()
-    conn.close()
-    return metrics
+def log_event(event_type, message, user_id=None):
+    # O horário é capturado aqui, no mesmo formato de CURRENT_TIMESTAMP (UTC),
+    # para não depender do momento em que o lote é gravado.
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    _log_writer.enqueue((timestamp, event_type, message, user_id, event_severity(event_type)))
+
+def flush_logs():
+    _log_writer.flush()
+
+def add_news_metric(user_id, post_id, title, link, score, fingerprint_id=None):
+    with db_connection() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO news_metrics (user_id, post_id, title, link, score, fingerprint_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, post_id, title, link, score, fingerprint_id)
+        )
+        if cursor.rowcount == 1:
+            day = conn.execute("SELECT date(analysis_date) FROM news_metrics WHERE id = ?", (cursor.lastrowid,)).fetchone()[0]
+            _add_metric_to_daily_summary(conn, user_id, day, post_id, title, link, score)
+            touch_cache_versions(conn, cache_scopes_for_users([user_id]))
 
 def add_published_post(user_id, post_id):
-    conn = get_db_connection()
-    conn.execute("INSERT OR IGNORE INTO published_posts (user_id, post_id) VALUES (?, ?)", (user_id, post_id))
-    conn.commit()
-    conn.close()
-
-def get_published_post_ids(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT post_id FROM published_posts WHERE user_id = ?", (user_id,))
-    ids = [row['post_id'] for row in cursor.fetchall()]
-    conn.close()
-    return ids
-
-def get_logs_by_username(username):
-    conn = get_db_connection()
-    logs = conn.execute(
-        "SELECT * FROM event_logs WHERE message LIKE ? ORDER BY timestamp DESC LIMIT 20", 
-        (f'%{username}%',)
-    ).fetchall()
-    conn.close()
-    return logs
+    claim_published_post(user_id, post_id)
+
+def claim_published_post(user_id, post_id, fingerprint_id=None, instagram_user=None):
+    """
+    Reserva a notícia para publicação de forma atômica. Retorna False se ela já
+    tinha sido publicada (ou reservada por outra execução) para este cliente.
+    Com `fingerprint_id` e `instagram_user`, também retorna False se a mesma
+    notícia (com outro post ID ou vinda de outro cliente) já saiu nessa conta.
+    """
+    with db_connection() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO published_posts (user_id, post_id, fingerprint_id)
+            SELECT ?, ?, ? WHERE NOT EXISTS (
+                SELECT 1 FROM published_posts p JOIN client_configs c ON c.user_id = p.user_id
+                WHERE p.fingerprint_id = ? AND c.instagram_user = ?
+            )
+            ON CONFLICT (user_id, post_id) DO NOTHING
+            """,
+            (user_id, post_id, fingerprint_id, fingerprint_id, instagram_user)
+        )
+        if cursor.rowcount != 1:
+            return False
+        day = conn.execute("SELECT date(published_at) FROM published_posts WHERE id = ?", (cursor.lastrowid,)).fetchone()[0]
+        _add_posts_to_daily_summary(conn, user_id, day, 1)
+        # Publicações entram na contagem geral do painel admin
+        touch_cache_versions(conn, cache_scopes_for_users([user_id], include_global=True))
+        return True
+
+def release_published_post(user_id, post_id):
+    """Desfaz a reserva de `claim_published_post` quando a publicação falha."""
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT date(published_at) AS day FROM published_posts WHERE user_id = ? AND post_id = ?", (user_id, post_id)
+        ).fetchone()
+        if row:
+            conn.execute("DELETE FROM published_posts WHERE user_id = ? AND post_id = ?", (user_id, post_id))
+            _add_posts_to_daily_summary(conn, user_id, row['day'], -1)
+            touch_cache_versions(conn, cache_scopes_for_users([user_id], include_global=True))
+
+def get_latest_daily_report(user_id):
+    """Resumo do dia mais recente com notícias analisadas, com `top_news` já decodificado."""
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM daily_report_summary WHERE user_id = ? AND news_count > 0 ORDER BY day DESC LIMIT 1",
+            (user_id,)
+        ).fetchone()
+    if not row:
+        return None
+    report = dict(row)
+    report['top_news'] = json.loads(report['top_news'])
+    report['score_histogram'] = json.loads(report['score_histogram'])
+    return report
+
+def get_user_performance_summary(user_id):
+    """Totais da aba "Resultados", somados a partir do resumo diário do cliente."""
+    with db_connection() as conn:
+        row = conn.execute(
+            """
+            SELECT COALESCE(SUM(news_count), 0) AS news_analyzed, COALESCE(SUM(posts_published), 0) AS posts_published
+            FROM daily_report_summary WHERE user_id = ?
+            """,
+            (user_id,)
+        ).fetchone()
+    return dict(row)
+
+def get_published_post_ids_among(user_id, post_ids):
+    """Dentre os `post_ids` candidatos, retorna o conjunto dos que já foram publicados."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return set()
+    placeholders = ', '.join('?' for _ in post_ids)
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT post_id FROM published_posts WHERE user_id = ? AND post_id IN ({placeholders})",
+            (user_id, *post_ids)
+        ).fetchall()
+    return {row['post_id'] for row in rows}
+
+def get_logs_by_user(user_id):
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM event_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT 20", 
+            (user_id,)
+        ).fetchall()
 
 def get_news_metrics_by_user(user_id):
-    conn = get_db_connection()
-    metrics = conn.execute(
-        "SELECT * FROM news_metrics WHERE user_id = ? ORDER BY analysis_date DESC", 
-        (user_id,)
-    ).fetchall()
-    conn.close()
-    return metrics
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM news_metrics WHERE user_id = ? ORDER BY analysis_date DESC", 
+            (user_id,)
+        ).fetchall()
+
+def get_recent_news_metric_titles(user_id, limit):
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT title, score FROM news_metrics WHERE user_id = ? ORDER BY analysis_date DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
 
 def get_posts_per_client():
-    conn = get_db_connection()
     query = """
         SELECT u.username, COUNT(p.id) as post_count
         FROM users u
@@ -249,55 +972,527 @@ def get_posts_per_client():
         GROUP BY u.id
         ORDER BY u.username
     """
-    clients_activity = conn.execute(query).fetchall()
-    conn.close()
+    with db_connection() as conn:
+        clients_activity = conn.execute(query).fetchall()
     return [dict(row) for row in clients_activity]
 
-def get_all_published_posts():
-    conn = get_db_connection()
-    posts = conn.execute('SELECT * FROM published_posts').fetchall()
-    conn.close()
-    return posts
-
-def get_error_logs():
-    conn = get_db_connection()
-    errors = conn.execute("SELECT * FROM event_logs WHERE event_type LIKE 'Erro%'").fetchall()
-    conn.close()
-    return errors
-
-def get_agent_start_logs():
-    conn = get_db_connection()
-    runs = conn.execute("SELECT * FROM event_logs WHERE event_type = 'Início do Agente'").fetchall()
-    conn.close()
-    return runs
-
 def add_remix_topics(topics):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    for topic in topics:
-        cursor.execute("INSERT INTO remix_topics (topic) VALUES (?)", (topic,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.executemany("INSERT INTO remix_topics (topic) VALUES (?)", [(topic,) for topic in topics])
 
 def get_unused_remix_topic():
-    conn = get_db_connection()
-    topic = conn.execute("SELECT * FROM remix_topics WHERE is_used = 0 ORDER BY RANDOM() LIMIT 1").fetchone()
-    if topic:
-        conn.execute("UPDATE remix_topics SET is_used = 1 WHERE id = ?", (topic['id'],))
-        conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        topic = conn.execute("SELECT * FROM remix_topics WHERE is_used = 0 ORDER BY RANDOM() LIMIT 1").fetchone()
+        if topic:
+            conn.execute("UPDATE remix_topics SET is_used = 1 WHERE id = ?", (topic['id'],))
     return topic['topic'] if topic else None
 
-def get_success_logs_for_client(username):
-    conn = get_db_connection()
-    query = "SELECT * FROM event_logs WHERE event_type = 'Publicação Instagram' AND message LIKE ?"
-    logs = conn.execute(query, (f'%para {username}.%',)).fetchall()
-    conn.close()
-    return logs
-
-def get_error_logs_for_client(username):
-    conn = get_db_connection()
-    query = "SELECT * FROM event_logs WHERE event_type = 'Erro de Publicação' AND message LIKE ?"
-    logs = conn.execute(query, (f'%para {username}.%',)).fetchall()
-    conn.close()
-    return logs
\ No newline at end of file
+def get_success_logs_for_client(user_id):
+    query = "SELECT * FROM event_logs WHERE user_id = ? AND event_type = 'Publicação Instagram' ORDER BY timestamp DESC"
+    with db_connection() as conn:
+        return conn.execute(query, (user_id,)).fetchall()
+
+def get_error_logs_for_client(user_id):
+    query = "SELECT * FROM event_logs WHERE user_id = ? AND event_type = 'Erro de Publicação' ORDER BY timestamp DESC"
+    with db_connection() as conn:
+        return conn.execute(query, (user_id,)).fetchall()
+
+def get_wordpress_fetch_cache(site_url):
+    with db_connection() as conn:
+        return conn.execute('SELECT * FROM wordpress_fetch_cache WHERE site_url = ?', (site_url,)).fetchone()
+
+def save_wordpress_fetch_cache(site_url, etag, last_modified, last_post_date, posts):
+    with db_connection() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO wordpress_fetch_cache (site_url, etag, last_modified, last_post_date, posts_json, fetched_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """,
+            (site_url, etag, last_modified, last_post_date, json.dumps(posts, ensure_ascii=False))
+        )
+
+def get_fresh_wordpress_news(site_url, max_age_seconds):
+    """Notícias do cache do site se a última coleta tiver menos de `max_age_seconds`; senão None."""
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT posts_json FROM wordpress_fetch_cache WHERE site_url = ? AND fetched_at >= datetime('now', ?)",
+            (site_url, f'-{int(max_age_seconds)} seconds')
+        ).fetchone()
+    return json.loads(row['posts_json']) if row else None
+
+def touch_wordpress_fetch_cache(site_url):
+    """Marca o cache do site como atualizado agora (resposta 304 do WordPress)."""
+    with db_connection() as conn:
+        conn.execute("UPDATE wordpress_fetch_cache SET fetched_at = CURRENT_TIMESTAMP WHERE site_url = ?", (site_url,))
+
+def claim_wordpress_fetch(site_url, owner, lease_seconds, now):
+    """
+    Reserva a coleta do site para `owner` até `now + lease_seconds` (epoch).
+    Retorna False se outra instância tem uma reserva ainda válida.
+    """
+    with db_connection() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO wordpress_fetch_leases (site_url, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (site_url) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE wordpress_fetch_leases.expires_at < ?
+            """,
+            (site_url, owner, now + lease_seconds, now)
+        )
+        return cursor.rowcount == 1
+
+def release_wordpress_fetch(site_url, owner):
+    with db_connection() as conn:
+        conn.execute("DELETE FROM wordpress_fetch_leases WHERE site_url = ? AND owner = ?", (site_url, owner))
+
+def get_instagram_session(instagram_user):
+    with db_connection() as conn:
+        row = conn.execute(
+            'SELECT settings_encrypted FROM instagram_sessions WHERE instagram_user = ?', (instagram_user,)
+        ).fetchone()
+    return row['settings_encrypted'] if row else None
+
+def save_instagram_session(instagram_user, settings_encrypted):
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO instagram_sessions (instagram_user, settings_encrypted, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (instagram_user, settings_encrypted)
+        )
+
+def delete_instagram_session(instagram_user):
+    with db_connection() as conn:
+        conn.execute('DELETE FROM instagram_sessions WHERE instagram_user = ?', (instagram_user,))
+
+# --- IMPRESSÕES DIGITAIS DAS NOTÍCIAS ---
+# Uma linha por notícia distinta (ver fingerprints.py). Cópias exatas são achadas
+# pelo hash do título normalizado ou pelo link canônico; quase-duplicatas, pelas
+# faixas MinHash em comum, confirmadas pela similaridade dos termos guardados.
+# Só contam impressões com data de publicação próxima da notícia nova: títulos
+# recorrentes (previsão do tempo, cotação do dia) viram notícias distintas.
+
+def _token_similarity(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+def resolve_news_fingerprints(entries, min_similarity=None, window_hours=12):
+    """
+    Associa cada impressão de `entries` (saída de fingerprints.compute) a uma
+    linha do índice com data de publicação a até `window_hours` da notícia,
+    criando as que ainda não existem. Retorna, na mesma ordem, pares
+    (fingerprint_id, artefatos) com os artefatos já guardados para a notícia.
+    Sem `min_similarity`, só cópias exatas são reconhecidas.
+    """
+    resolved = []
+    window = timedelta(hours=window_hours)
+    with db_connection() as conn:
+        if not conn.in_transaction:
+            # Consulta e inserção sob o lock de escrita: duas execuções simultâneas
+            # não registram a mesma notícia duas vezes
+            conn.execute("BEGIN IMMEDIATE")
+        for entry in entries:
+            story_date = entry['story_date']
+            bounds = [(story_date - window).strftime('%Y-%m-%d %H:%M:%S'), (story_date + window).strftime('%Y-%m-%d %H:%M:%S')]
+            row = conn.execute(
+                """
+                SELECT id, artifacts FROM news_fingerprints
+                WHERE (title_hash = ? OR canonical_link = ?) AND story_date BETWEEN ? AND ?
+                ORDER BY story_date DESC LIMIT 1
+                """,
+                (entry['title_hash'], entry['canonical_link'], *bounds)
+            ).fetchone()
+            if row is None and min_similarity is not None and entry['bands']:
+                candidates = conn.execute(
+                    f"""
+                    SELECT id, artifacts FROM news_fingerprints
+                    WHERE story_date BETWEEN ? AND ? AND id IN (
+                        SELECT fingerprint_id FROM news_fingerprint_bands WHERE band_key IN ({', '.join('?' for _ in entry['bands'])})
+                    )
+                    """,
+                    (*bounds, *entry['bands'])
+                ).fetchall()
+                tokens = entry['artifacts']['tokens']
+                scored = [(_token_similarity(tokens, json.loads(c['artifacts']).get('tokens', [])), -c['id'], c) for c in candidates]
+                best = max(scored, default=None, key=lambda item: item[:2])
+                if best is not None and best[0] >= min_similarity:
+                    row = best[2]
+            if row is not None:
+                resolved.append((row['id'], json.loads(row['artifacts'])))
+                continue
+            cursor = conn.execute(
+                "INSERT INTO news_fingerprints (title_hash, canonical_link, title, artifacts, story_date) VALUES (?, ?, ?, ?, ?)",
+                (entry['title_hash'], entry['canonical_link'], entry['title'],
+                 json.dumps(entry['artifacts'], ensure_ascii=False), story_date.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO news_fingerprint_bands (band_key, fingerprint_id) VALUES (?, ?)",
+                [(band_key, cursor.lastrowid) for band_key in entry['bands']]
+            )
+            resolved.append((cursor.lastrowid, entry['artifacts']))
+    return resolved
+
+def get_analyzed_fingerprints_among(user_id, fingerprint_ids):
+    """Dentre as impressões candidatas, as já analisadas para o cliente: {fingerprint_id: post_id}."""
+    fingerprint_ids = [f for f in fingerprint_ids if f is not None]
+    if not fingerprint_ids:
+        return {}
+    placeholders = ', '.join('?' for _ in fingerprint_ids)
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT fingerprint_id, post_id FROM news_metrics WHERE user_id = ? AND fingerprint_id IN ({placeholders})",
+            (user_id, *fingerprint_ids)
+        ).fetchall()
+    return {row['fingerprint_id']: row['post_id'] for row in rows}
+
+def get_published_fingerprints_for_account(instagram_user, fingerprint_ids):
+    """Dentre as impressões candidatas, o conjunto das já publicadas na conta do Instagram (por qualquer cliente)."""
+    fingerprint_ids = [f for f in fingerprint_ids if f is not None]
+    if not fingerprint_ids:
+        return set()
+    placeholders = ', '.join('?' for _ in fingerprint_ids)
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT DISTINCT p.fingerprint_id FROM published_posts p JOIN client_configs c ON c.user_id = p.user_id
+            WHERE c.instagram_user = ? AND p.fingerprint_id IN ({placeholders})
+            """,
+            (instagram_user, *fingerprint_ids)
+        ).fetchall()
+    return {row['fingerprint_id'] for row in rows}
+
+# --- PAGINAÇÃO POR CURSOR ---
+# As listagens dos painéis usam keyset pagination: cada página continua a partir
+# da chave da última linha da página anterior, sempre pelo índice, então o custo
+# de uma página não depende do tamanho da tabela nem da posição na listagem.
+
+# Tamanho padrão e máximo de uma página
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Decodifica o cursor opaco recebido da API. Levanta ValueError se ele for inválido."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor inválido")
+    # Só valores escalares chegam aos parâmetros da consulta (bool é int em Python)
+    if any(isinstance(value, bool) or not isinstance(value, (int, float, str)) for value in values):
+        raise ValueError("Cursor inválido")
+    return values
+
+def _page(rows, limit, key):
+    """Monta a página a partir de até `limit + 1` linhas (a linha extra só indica que há mais)."""
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(key(items[-1])) if len(rows) > limit else None
+    return {'items': items, 'next': next_cursor}
+
+def get_logs_page(limit=PAGE_SIZE_DEFAULT, after=None, user_id=None):
+    """Logs do mais recente para o mais antigo, opcionalmente de um único cliente."""
+    filters, params = [], []
+    if user_id is not None:
+        filters.append("user_id = ?")
+        params.append(user_id)
+    if after:
+        filters.append("(timestamp, id) < (?, ?)")
+        params.extend(decode_cursor(after, 2))
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM event_logs {where} ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+    return _page(rows, limit, lambda item: [item['timestamp'], item['id']])
+
+def get_clients_page(limit=PAGE_SIZE_DEFAULT, after=None):
+    """Clientes (não administradores) em ordem de cadastro."""
+    params = []
+    where = "WHERE is_admin = 0"
+    if after:
+        where += " AND id > ?"
+        params.extend(decode_cursor(after, 1))
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, username, status, razao_social, cnpj, email, telefone, responsavel FROM users {where} ORDER BY id LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+    return _page(rows, limit, lambda item: [item['id']])
+
+def get_news_metrics_page(limit=PAGE_SIZE_DEFAULT, after=None, user_id=None):
+    """Notícias analisadas da mais recente para a mais antiga, opcionalmente de um único cliente."""
+    filters, params = [], []
+    if user_id is not None:
+        filters.append("user_id = ?")
+        params.append(user_id)
+    if after:
+        filters.append("(analysis_date, id) < (?, ?)")
+        params.extend(decode_cursor(after, 2))
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM news_metrics {where} ORDER BY analysis_date DESC, id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+    return _page(rows, limit, lambda item: [item['analysis_date'], item['id']])
+
+# --- CONSULTAS AGREGADAS PARA OS DASHBOARDS ---
+# Devolvem apenas contagens (COUNT/GROUP BY) resolvidas pelos índices,
+# sem carregar as linhas de log para a memória.
+
+AGENT_START_EVENT = 'Início do Agente'
+PUBLISH_SUCCESS_EVENT = 'Publicação Instagram'
+PUBLISH_ERROR_EVENT = 'Erro de Publicação'
+
+def get_agent_health_counts():
+    query = """
+        SELECT
+            (SELECT COUNT(*) FROM event_logs WHERE event_type = ?) AS agent_runs,
+            (SELECT COUNT(*) FROM published_posts) AS published_posts,
+            (SELECT COUNT(*) FROM event_logs WHERE severity = 'erro') AS errors
+    """
+    with db_connection() as conn:
+        return dict(conn.execute(query, (AGENT_START_EVENT,)).fetchone())
+
+def get_client_event_counts(user_id, event_types):
+    """Retorna {event_type: total} para um cliente, com zero nos tipos sem eventos."""
+    placeholders = ', '.join('?' for _ in event_types)
+    query = f"""
+        SELECT event_type, COUNT(*) AS total
+        FROM event_logs
+        WHERE user_id = ? AND event_type IN ({placeholders})
+        GROUP BY event_type
+    """
+    with db_connection() as conn:
+        rows = conn.execute(query, (user_id, *event_types)).fetchall()
+    counts = {event_type: 0 for event_type in event_types}
+    counts.update({row['event_type']: row['total'] for row in rows})
+    return counts
+
+def get_event_counts_by_day(event_types, days=30, user_id=None):
+    """Contagem diária por tipo de evento nos últimos `days` dias."""
+    placeholders = ', '.join('?' for _ in event_types)
+    params = [*event_types, f'-{int(days)} days']
+    user_filter = ''
+    if user_id is not None:
+        user_filter = 'AND user_id = ?'
+        params.append(user_id)
+    query = f"""
+        SELECT date(timestamp) AS day, event_type, COUNT(*) AS total
+        FROM event_logs
+        WHERE event_type IN ({placeholders}) AND timestamp >= datetime('now', ?) {user_filter}
+        GROUP BY day, event_type
+        ORDER BY day
+    """
+    with db_connection() as conn:
+        return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+def get_event_counts_by_client(event_types):
+    """Contagem por cliente e tipo de evento, para comparar a frota inteira."""
+    placeholders = ', '.join('?' for _ in event_types)
+    query = f"""
+        SELECT u.username, e.event_type, COUNT(*) AS total
+        FROM event_logs e
+        JOIN users u ON u.id = e.user_id
+        WHERE e.event_type IN ({placeholders})
+        GROUP BY e.user_id, e.event_type
+        ORDER BY u.username
+    """
+    with db_connection() as conn:
+        return [dict(row) for row in conn.execute(query, event_types).fetchall()]
+
+# --- FILA DE TAREFAS (JOBS) ---
+# Estados: 'pendente' -> 'executando' -> 'concluido' | 'falhou'.
+# Um job 'executando' com lease vencido (processo que caiu) volta a ser elegível.
+
+def enqueue_job(task, client_id=None, max_attempts=3):
+    """Enfileira um job. Retorna False se já houver um job ativo da mesma tarefa para o cliente."""
+    with db_connection() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (task, client_id, max_attempts) VALUES (?, ?, ?)",
+            (task, client_id, max_attempts)
+        )
+        return cursor.rowcount == 1
+
+def claim_job(worker_id, lease_seconds, tasks=None, client_ids=None):
+    """
+    Reserva o próximo job elegível para `worker_id`, com lease de `lease_seconds`.
+    Jobs de um cliente que já tem outro job em execução ficam para depois.
+    Com `client_ids` (modo com shards), só reserva jobs desses clientes ou jobs gerais.
+    """
+    task_filter = ''
+    params = [worker_id, f'+{int(lease_seconds)} seconds']
+    if tasks:
+        task_filter = f"AND j.task IN ({', '.join('?' for _ in tasks)})"
+        params.extend(tasks)
+    if client_ids is not None:
+        client_ids = list(client_ids)
+        placeholders = ', '.join('?' for _ in client_ids) or 'NULL'
+        task_filter += f" AND (j.client_id IS NULL OR j.client_id IN ({placeholders}))"
+        params.extend(client_ids)
+    with db_connection() as conn:
+        # Jobs abandonados que já esgotaram as tentativas não voltam para a fila
+        conn.execute(
+            """
+            UPDATE jobs SET state = 'falhou', last_error = 'Lease expirado', lease_owner = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE state = 'executando' AND lease_expires_at < datetime('now') AND attempts >= max_attempts
+            """
+        )
+        job = conn.execute(
+            f"""
+            UPDATE jobs SET
+                state = 'executando',
+                attempts = attempts + 1,
+                lease_owner = ?,
+                lease_expires_at = datetime('now', ?),
+                started_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT j.id FROM jobs j
+                WHERE ((j.state = 'pendente' AND j.run_after <= datetime('now'))
+                       OR (j.state = 'executando' AND j.lease_expires_at < datetime('now')))
+                  {task_filter}
+                  AND (j.client_id IS NULL OR NOT EXISTS (
+                      SELECT 1 FROM jobs o
+                      WHERE o.client_id = j.client_id AND o.id != j.id
+                        AND o.state = 'executando' AND o.lease_expires_at >= datetime('now')
+                  ))
+                ORDER BY j.run_after, j.id
+                LIMIT 1
+            )
+            RETURNING *
+            """,
+            params
+        ).fetchone()
+    return job
+
+def renew_job_leases(worker_id, job_ids, lease_seconds):
+    if not job_ids:
+        return
+    placeholders = ', '.join('?' for _ in job_ids)
+    with db_connection() as conn:
+        conn.execute(
+            f"UPDATE jobs SET lease_expires_at = datetime('now', ?) WHERE lease_owner = ? AND state = 'executando' AND id IN ({placeholders})",
+            (f'+{int(lease_seconds)} seconds', worker_id, *job_ids)
+        )
+
+def complete_job(job_id, worker_id):
+    with db_connection() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET state = 'concluido', lease_owner = NULL, lease_expires_at = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (job_id, worker_id)
+        )
+
+def fail_job(job_id, worker_id, error, backoff_seconds):
+    """Devolve o job para a fila com backoff exponencial, ou marca como 'falhou' se esgotou as tentativas."""
+    with db_connection() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET
+                state = CASE WHEN attempts >= max_attempts THEN 'falhou' ELSE 'pendente' END,
+                run_after = datetime('now', '+' || (? * (1 << (attempts - 1))) || ' seconds'),
+                finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP END,
+                last_error = ?,
+                lease_owner = NULL,
+                lease_expires_at = NULL
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (int(backoff_seconds), error, job_id, worker_id)
+        )
+
+def get_job_counts():
+    with db_connection() as conn:
+        rows = conn.execute("SELECT state, COUNT(*) AS total FROM jobs GROUP BY state").fetchall()
+    return {row['state']: row['total'] for row in rows}
+
+# --- INSTÂNCIAS DO AGENTE (SHARDS) ---
+
+def heartbeat_agent_instance(instance_id):
+    with db_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO agent_instances (instance_id) VALUES (?)
+            ON CONFLICT (instance_id) DO UPDATE SET heartbeat_at = CURRENT_TIMESTAMP
+            """,
+            (instance_id,)
+        )
+
+def get_live_agent_instances(ttl_seconds):
+    """IDs das instâncias com heartbeat nos últimos `ttl_seconds` segundos."""
+    with db_connection() as conn:
+        rows = conn.execute(
+            "SELECT instance_id FROM agent_instances WHERE heartbeat_at >= datetime('now', ?) ORDER BY instance_id",
+            (f'-{int(ttl_seconds)} seconds',)
+        ).fetchall()
+    return [row['instance_id'] for row in rows]
+
+def remove_agent_instance(instance_id):
+    with db_connection() as conn:
+        conn.execute("DELETE FROM agent_instances WHERE instance_id = ?", (instance_id,))
+
+def get_active_client_ids():
+    with db_connection() as conn:
+        rows = conn.execute(
+            "SELECT u.id FROM users u JOIN client_configs c ON u.id = c.user_id WHERE u.status = 'ativo' ORDER BY u.id"
+        ).fetchall()
+    return [row['id'] for row in rows]
+
+# --- VERSÕES PARA O CACHE DOS PAINÉIS ---
+# Cada escrita relevante incrementa, na mesma transação, a versão dos escopos cujos
+# dados mudou: o do cliente e, só quando os gráficos agregados do painel admin
+# mudam, o escopo global. Os painéis (em outros processos) só consultam essas
+# versões para saber se a resposta em cache ainda vale.
+
+CACHE_SCOPE_GLOBAL = 'global'
+
+def cache_scope_for_user(user_id):
+    return f"cliente:{user_id}"
+
+def cache_scopes_for_users(user_ids, include_global=False):
+    """Escopos dos clientes em `user_ids` (ids nulos são ignorados), com o global se pedido."""
+    scopes = [cache_scope_for_user(user_id) for user_id in sorted(set(user_ids) - {None})]
+    return [CACHE_SCOPE_GLOBAL] + scopes if include_global else scopes
+
+def _event_changes_global_charts(event_type, severity):
+    # Eventos contados pelos gráficos do painel admin (get_agent_health_counts,
+    # get_event_counts_by_day/by_client com os eventos de publicação)
+    return severity == 'erro' or event_type in (AGENT_START_EVENT, PUBLISH_SUCCESS_EVENT, PUBLISH_ERROR_EVENT)
+
+def touch_cache_versions(conn, scopes):
+    """Invalida os escopos em `scopes` (CACHE_SCOPE_GLOBAL e/ou cache_scope_for_user)."""
+    if not scopes:
+        return
+    conn.executemany(
+        "INSERT INTO cache_versions (scope, version) VALUES (?, 1) ON CONFLICT (scope) DO UPDATE SET version = version + 1",
+        [(scope,) for scope in dict.fromkeys(scopes)]
+    )
+
+def get_cache_versions(scopes):
+    """Versão atual de cada escopo, na mesma ordem (0 para escopos nunca alterados)."""
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT scope, version FROM cache_versions WHERE scope IN ({','.join('?' * len(scopes))})", list(scopes)
+        ).fetchall()
+    versions = {row['scope']: row['version'] for row in rows}
+    return [versions.get(scope, 0) for scope in scopes]
+
+# --- INSTRUMENTAÇÃO ---
+# Toda função pública deste módulo é envolvida por um timer (histograma
+# newsbot_db_call_seconds, rótulo = nome da função). Ficam de fora os utilitários
+# que não acessam o banco, o próprio gerenciador de conexões e check_password,
+# que só roda o bcrypt e distorceria a latência de banco (e revelaria o tempo dos logins).
+_UNINSTRUMENTED = {
+    'get_db_connection', 'get_pool', 'db_connection', 'event_severity',
+    'cache_scope_for_user', 'cache_scopes_for_users', 'encode_cursor', 'decode_cursor', 'migrate_schema',
+    'check_password',
+}
+
+def _instrument_module():
+    for name, value in list(globals().items()):
+        if (inspect.isfunction(value) and value.__module__ == __name__
+                and not name.startswith('_') and name not in _UNINSTRUMENTED):
+            globals()[name] = metrics.timed(metrics.DB_CALL_SECONDS, function=name)(value)
+
+_instrument_module()
@@ -1,15 +1,22 @@
 # email_client.py - VERSÃO MELHORADA
 
 import smtplib
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from datetime import date
 
+import metrics
+
 # Importações do arquivo de configuração
-from config import EMAIL_HOST, EMAIL_PORT, EMAIL_SUBJECT
+from config import (
+    EMAIL_HOST, EMAIL_PORT, EMAIL_SUBJECT, EMAIL_USE_TLS,
+    EMAIL_MAX_CONNECTIONS, EMAIL_TIMEOUT
+)
 
-def send_report(sender, password, recipient, top_news, client_name=None):
-    """Envia um email com as top notícias."""
+def build_report_message(sender, recipient, top_news, client_name=None):
+    """Monta o email com as top notícias."""
     
     # Personaliza o assunto do email
     subject_name = f" para {client_name}" if client_name else ""
@@ -28,14 +35,121 @@ def send_report(sender, password, recipient, top_news, client_name=None):
     msg['To'] = recipient
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def _is_connection_error(error):
+    """
+    Sessão caiu ou a rede falhou. As respostas de erro do servidor também são
+    OSError (smtplib.SMTPException), mas reconectar não resolve nenhuma delas.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+class SMTPConnection:
+    """
+    Conexão SMTP autenticada e reutilizável. Abre a conexão na primeira mensagem
+    e reconecta (uma vez por mensagem) se o servidor tiver derrubado a sessão.
+    Erros do servidor (destinatário recusado, autenticação...) sobem sem nova tentativa.
+    """
+
+    def __init__(self, sender, password, host=EMAIL_HOST, port=EMAIL_PORT):
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=EMAIL_TIMEOUT)
+        if EMAIL_USE_TLS:
+            server.starttls()
+        server.login(self.sender, self.password)
+        self._server = server
+
+    @metrics.timed(metrics.OPERATION_SECONDS, operation='smtp_send')
+    def send(self, msg):
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except OSError as e:
+            if not _is_connection_error(e):
+                raise
+            self.close()
+            self._connect()
+            self._server.send_message(msg)
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
 
-    try:
-        # Conecta e envia
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender, password)
-        server.send_message(msg)
-        server.quit()
-        print(f"[EMAIL] Relatório enviado com sucesso para {recipient}!")
-    except Exception as e:
-        print(f"[ERRO EMAIL] Falha ao enviar relatório para {recipient}: {e}")
\ No newline at end of file
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def send_reports(sender, password, reports):
+    """
+    Envia vários relatórios reutilizando conexões SMTP autenticadas.
+    `reports` é uma lista de dicts com 'recipient', 'top_news' e, opcionalmente, 'client_name'.
+    Usa até EMAIL_MAX_CONNECTIONS conexões em paralelo e devolve, na mesma ordem,
+    um dict por relatório com 'recipient', 'success' e 'error'. Se o servidor
+    recusar as credenciais, o lote é abortado e os relatórios restantes falham.
+    """
+    results = [None] * len(reports)
+    pending = queue.SimpleQueue()
+    for index, report in enumerate(reports):
+        pending.put(index)
+
+    def abort(error):
+        # Credenciais recusadas valem para todas as mensagens: nenhuma outra é tentada
+        while True:
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            results[index] = {'recipient': reports[index]['recipient'], 'success': False, 'error': str(error)}
+
+    def worker():
+        with SMTPConnection(sender, password) as connection:
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+                report = reports[index]
+                try:
+                    msg = build_report_message(sender, report['recipient'], report['top_news'], report.get('client_name'))
+                    connection.send(msg)
+                    results[index] = {'recipient': report['recipient'], 'success': True, 'error': None}
+                    print(f"[EMAIL] Relatório enviado com sucesso para {report['recipient']}!")
+                except Exception as e:
+                    # Destinatário recusado não afeta a sessão; nos demais erros a
+                    # conexão é descartada e a próxima mensagem abre uma nova
+                    if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                        connection.close()
+                    results[index] = {'recipient': report['recipient'], 'success': False, 'error': str(e)}
+                    print(f"[ERRO EMAIL] Falha ao enviar relatório para {report['recipient']}: {e}")
+                    if isinstance(e, smtplib.SMTPAuthenticationError):
+                        print("[ERRO EMAIL] Autenticação SMTP recusada; envio dos relatórios restantes cancelado.")
+                        abort(e)
+                        return
+
+    workers = min(EMAIL_MAX_CONNECTIONS, len(reports))
+    if workers:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email") as executor:
+            for future in [executor.submit(worker) for _ in range(workers)]:
+                future.result()
+    return results
+
+def send_report(sender, password, recipient, top_news, client_name=None):
+    """Envia um email com as top notícias."""
+    result = send_reports(sender, password, [{'recipient': recipient, 'top_news': top_news, 'client_name': client_name}])[0]
+    return result['success']
@@ -0,0 +1,123 @@
+# fingerprints.py - Impressão digital do conteúdo das notícias
+#
+# Vários clientes replicam as mesmas matérias de agência, cada uma com o post ID
+# do próprio site. A impressão digital identifica a notícia pelo conteúdo:
+# título normalizado e link canônico para cópias exatas, e MinHash dos termos
+# do título para versões levemente editadas. O índice fica na tabela
+# news_fingerprints, junto com os artefatos derivados (título normalizado e
+# termos), reaproveitados pelo score em vez de recalculados a cada rodada.
+
+import re
+import html
+import hashlib
+import unicodedata
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import database as db
+from config import NEAR_DUPLICATE_MIN_SIMILARITY, DUPLICATE_STORY_WINDOW_HOURS
+
+# Assinatura MinHash: MINHASH_BANDS faixas de MINHASH_ROWS_PER_BAND valores.
+# Com 8 faixas de 2, títulos com 80% dos termos em comum viram candidatos em
+# quase todos os casos; a confirmação usa a similaridade exata dos termos.
+MINHASH_BANDS = 8
+MINHASH_ROWS_PER_BAND = 2
+MINHASH_MIN_TOKENS = 3
+
+_NON_WORD_PATTERN = re.compile(r'[\W_]+')
+_TOKEN_PATTERN = re.compile(r'\w{3,}')
+
+# Parâmetros de rastreamento removidos do link canônico
+_TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'ref', 'amp', 'output'}
+
+def normalize_title(title):
+    """Título sem HTML, acentos, pontuação e caixa, com espaços colapsados."""
+    text = unicodedata.normalize('NFKD', html.unescape(title or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD_PATTERN.sub(' ', text.casefold()).strip()
+
+def title_tokens(normalized_title):
+    """Termos (3+ caracteres) de um título já normalizado, sem repetição e em ordem."""
+    return list(dict.fromkeys(_TOKEN_PATTERN.findall(normalized_title)))
+
+def canonical_link(link):
+    """
+    Link sem esquema, 'www.', fragmento, barra final, sufixo /amp e parâmetros
+    de rastreamento (utm_* e afins). Links vazios ou inválidos viram None.
+    """
+    try:
+        parts = urlsplit((link or '').strip())
+    except ValueError:
+        return None
+    host = (parts.hostname or '').lower()
+    if not host:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+    path = re.sub(r'/amp/?$', '', parts.path).rstrip('/')
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in _TRACKING_PARAMS
+    )
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else '')
+
+def minhash_bands(tokens):
+    """
+    Assinatura MinHash dos termos, agrupada em faixas para busca por LSH: títulos
+    com muitos termos em comum tendem a coincidir em pelo menos uma faixa.
+    Títulos com menos de MINHASH_MIN_TOKENS termos não entram na busca aproximada.
+    """
+    if len(tokens) < MINHASH_MIN_TOKENS:
+        return []
+    encoded = [token.encode('utf-8') for token in tokens]
+    signature = [
+        min(hashlib.blake2b(token, digest_size=8, salt=seed.to_bytes(2, 'big')).digest() for token in encoded)
+        for seed in range(MINHASH_BANDS * MINHASH_ROWS_PER_BAND)
+    ]
+    bands = []
+    for band in range(MINHASH_BANDS):
+        rows = b''.join(signature[band * MINHASH_ROWS_PER_BAND:(band + 1) * MINHASH_ROWS_PER_BAND])
+        digest = hashlib.blake2b(rows, digest_size=8, salt=band.to_bytes(2, 'big')).digest()
+        # Chave inteira com sinal, no intervalo do INTEGER do SQLite
+        bands.append(int.from_bytes(digest, 'big', signed=True))
+    return bands
+
+def story_date(noticia):
+    """Data de publicação da notícia (UTC, sem fuso); agora, se ausente ou inválida."""
+    try:
+        return datetime.strptime((noticia.get('date') or '').rstrip('Z')[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return datetime.utcnow().replace(microsecond=0)
+
+def compute(noticia):
+    """Impressão digital de uma notícia (dicionário no formato de wordpress_client)."""
+    normalized = normalize_title(noticia.get('title'))
+    tokens = title_tokens(normalized)
+    link = canonical_link(noticia.get('link'))
+    # Sem título, a identidade exata passa a ser o link (ou o post ID)
+    identity = normalized or link or f"post:{noticia.get('id')}"
+    return {
+        'title_hash': hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest(),
+        'canonical_link': link,
+        'bands': minhash_bands(tokens),
+        'title': noticia.get('title'),
+        'story_date': story_date(noticia),
+        'artifacts': {'title_norm': normalized, 'tokens': tokens},
+    }
+
+def annotate(noticias):
+    """
+    Devolve cópias das notícias com `fingerprint_id`, `title_norm` e `tokens`,
+    registrando as impressões novas no índice. Notícias repetidas dentro da
+    própria lista (mesma impressão) aparecem uma única vez, na primeira posição.
+    """
+    if not noticias:
+        return []
+    resolved = db.resolve_news_fingerprints(
+        [compute(noticia) for noticia in noticias], NEAR_DUPLICATE_MIN_SIMILARITY, DUPLICATE_STORY_WINDOW_HOURS
+    )
+    annotated = {}
+    for noticia, (fingerprint_id, artifacts) in zip(noticias, resolved):
+        if fingerprint_id not in annotated:
+            annotated[fingerprint_id] = dict(noticia, fingerprint_id=fingerprint_id, **artifacts)
+    return list(annotated.values())
@@ -1,24 +1,148 @@
 # ATUAL/instagram_client.py
 
+import json
+import threading
+from collections import OrderedDict
+from cryptography.fernet import Fernet, InvalidToken
 from instagrapi import Client
 from instagrapi.exceptions import LoginRequired
 import time
 
-def login(username, password):
-    """Faz login no Instagram e retorna o objeto do cliente."""
+import database as db
+import metrics
+from config import INSTAGRAM_SESSION_KEY, INSTAGRAM_SESSION_CACHE_SIZE, INSTAGRAM_SESSION_REVALIDATE_MINUTES
+
+def _build_fernet(key):
+    if not key:
+        print("[AVISO INSTAGRAM] INSTAGRAM_SESSION_KEY não configurada: as sessões não serão salvas no banco.")
+        return None
     try:
-        cl = Client()
-        # Adiciona um timeout para evitar que o login fique travado indefinidamente
-        cl.login_timeout = 15
-        cl.login(username, password)
-        return cl
-    except LoginRequired:
-        print(f"[ERRO INSTAGRAM] Login necessário, mas falhou para {username}. Verifique as credenciais ou a autenticação de dois fatores.")
+        return Fernet(key.encode('utf-8'))
+    except ValueError as e:
+        print(f"[ERRO INSTAGRAM] INSTAGRAM_SESSION_KEY inválida ({e}): as sessões não serão salvas no banco.")
         return None
+
+# Sem chave, cada execução faz login completo (nada é lido ou gravado no banco)
+_fernet = _build_fernet(INSTAGRAM_SESSION_KEY)
+
+# Clientes já autenticados, do menos para o mais recentemente usado:
+# instagram_user -> (Client, momento da última validação)
+_live_clients = OrderedDict()
+_live_clients_lock = threading.Lock()
+_login_locks = {}
+
+def _get_login_lock(username):
+    with _live_clients_lock:
+        return _login_locks.setdefault(username, threading.Lock())
+
+def _cache_client(username, cl):
+    with _live_clients_lock:
+        _live_clients[username] = (cl, time.monotonic())
+        _live_clients.move_to_end(username)
+        while len(_live_clients) > INSTAGRAM_SESSION_CACHE_SIZE:
+            _live_clients.popitem(last=False)
+
+def _save_session(username, cl):
+    if _fernet is None:
+        return
+    try:
+        encrypted = _fernet.encrypt(json.dumps(cl.get_settings()).encode('utf-8')).decode('utf-8')
+        db.save_instagram_session(username, encrypted)
     except Exception as e:
-        print(f"[ERRO INSTAGRAM] Falha inesperada no login para {username}: {e}")
+        print(f"[ERRO INSTAGRAM] Não foi possível salvar a sessão de {username}: {e}")
+
+def _load_session(username):
+    if _fernet is None:
+        return None
+    encrypted = db.get_instagram_session(username)
+    if not encrypted:
+        return None
+    try:
+        return json.loads(_fernet.decrypt(encrypted.encode('utf-8')))
+    except (InvalidToken, ValueError):
+        # Sessão salva com outra chave ou corrompida: descarta e faz login completo
+        db.delete_instagram_session(username)
         return None
 
+def _session_is_valid(username, cl):
+    """
+    Testa a sessão com uma chamada leve. Qualquer falha (LoginRequired, desafio,
+    erro de rede...) conta como sessão inválida: quem chama faz login completo.
+    """
+    try:
+        cl.get_timeline_feed()
+        return True
+    except LoginRequired:
+        return False
+    except Exception as e:
+        print(f"[ERRO INSTAGRAM] Falha ao revalidar a sessão de {username}: {e}")
+        return False
+
+def invalidate_session(username):
+    """Descarta a sessão em memória e a salva no banco (ex.: após um LoginRequired)."""
+    with _live_clients_lock:
+        _live_clients.pop(username, None)
+    db.delete_instagram_session(username)
+
+@metrics.timed(metrics.OPERATION_SECONDS, operation='instagram_login')
+def login(username, password):
+    """
+    Retorna um cliente do Instagram autenticado, reaproveitando sessões sempre que possível:
+    1. cliente vivo em memória (revalidado a cada INSTAGRAM_SESSION_REVALIDATE_MINUTES);
+    2. sessão criptografada salva no banco;
+    3. login completo com usuário e senha, mantendo os identificadores do aparelho.
+    Uma sessão que falha na revalidação, por qualquer erro, é descartada da memória
+    e do banco antes do login completo.
+    """
+    with _get_login_lock(username):
+        with _live_clients_lock:
+            cached = _live_clients.get(username)
+            if cached:
+                _live_clients.move_to_end(username)
+        try:
+            uuids = None
+            if cached:
+                cl, validated_at = cached
+                if time.monotonic() - validated_at < INSTAGRAM_SESSION_REVALIDATE_MINUTES * 60:
+                    return cl
+                if _session_is_valid(username, cl):
+                    _cache_client(username, cl)
+                    return cl
+                # A sessão salva no banco é a mesma que acabou de falhar: descarta as duas
+                uuids = cl.get_settings().get('uuids')
+                invalidate_session(username)
+            else:
+                settings = _load_session(username)
+                if settings:
+                    uuids = settings.get('uuids')
+                    cl = Client()
+                    cl.login_timeout = 15
+                    cl.set_settings(settings)
+                    if _session_is_valid(username, cl):
+                        print(f"[INSTAGRAM] Sessão salva reutilizada para {username}.")
+                        _cache_client(username, cl)
+                        return cl
+                    db.delete_instagram_session(username)
+
+            cl = Client()
+            # Adiciona um timeout para evitar que o login fique travado indefinidamente
+            cl.login_timeout = 15
+            if uuids:
+                # Reaproveita os identificadores do aparelho para não parecer um novo dispositivo
+                cl.set_uuids(uuids)
+            cl.login(username, password)
+            _save_session(username, cl)
+            _cache_client(username, cl)
+            return cl
+        except LoginRequired:
+            invalidate_session(username)
+            print(f"[ERRO INSTAGRAM] Login necessário, mas falhou para {username}. Verifique as credenciais ou a autenticação de dois fatores.")
+            return None
+        except Exception as e:
+            print(f"[ERRO INSTAGRAM] Falha inesperada no login para {username}: {e}")
+            return None
+
+@metrics.timed(metrics.OPERATION_SECONDS, operation='instagram_publish')
 def post_to_instagram(cl, noticia):
     """Posta uma notícia no Instagram (atualmente como placeholder)."""
     try:
@@ -33,6 +157,7 @@ def post_to_instagram(cl, noticia):
         print(f"[ERRO INSTAGRAM] Falha ao postar: {e}")
         return False
 
+@metrics.timed(metrics.OPERATION_SECONDS, operation='instagram_stats')
 def get_user_stats(username, password):
     """Busca estatísticas de um usuário do Instagram."""
     cl = login(username, password)
@@ -45,6 +170,10 @@ def get_user_stats(username, password):
             'following': user_info.following_count,
             'media_count': user_info.media_count
         }
+    except LoginRequired:
+        invalidate_session(username)
+        print(f"[ERRO INSTAGRAM] Sessão expirada ao buscar estatísticas para {username}.")
+        return None
     except Exception as e:
         print(f"[ERRO INSTAGRAM] Falha ao buscar estatísticas para {username}: {e}")
         return None
\ No newline at end of file
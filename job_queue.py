@@ -0,0 +1,162 @@
+# job_queue.py - Fila de tarefas persistente (SQLite) e pool de workers
+#
+# O agendador só enfileira jobs (database.enqueue_job); os workers reservam os
+# jobs com lease, executam o handler da tarefa e marcam o resultado. Como tudo
+# fica no banco, o trabalho sobrevive a reinícios e pode ser dividido entre
+# vários processos apontando para o mesmo agente.db.
+
+import os
+import socket
+import inspect
+import threading
+import traceback
+import contextvars
+
+import database as db
+import metrics
+from async_engine import get_engine, run_blocking
+from config import JOB_WORKER_CONCURRENCY, JOB_MAX_ASYNC_JOBS, JOB_LEASE_SECONDS, JOB_RETRY_BACKOFF_SECONDS, JOB_POLL_SECONDS
+
+# Job em execução no contexto atual (thread do worker ou tarefa do event loop)
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+def current_stop_check():
+    """
+    Função sem argumentos que diz se o job em execução deve parar. Pode ser
+    chamada de outra thread (ex.: no event loop). Fora de um job, nunca pede parada.
+    """
+    current = _current_job.get()
+    if current is None:
+        return lambda: False
+    pool, job_id = current
+    return lambda: pool.stop_requested(job_id)
+
+class WorkerPool:
+    """
+    Executa jobs da fila com até `concurrency` threads.
+    `handlers` mapeia o nome da tarefa para uma função: tarefas por cliente recebem
+    o `client_id`; tarefas gerais (client_id nulo) são chamadas sem argumentos.
+    Handlers `async def` rodam no event loop do agente (até `max_async_jobs` ao
+    mesmo tempo) e não prendem a thread do worker enquanto esperam.
+    Com `membership` (sharding.ShardMembership), só os jobs dos clientes da
+    partição desta instância são reservados.
+    """
+
+    def __init__(self, handlers, concurrency=JOB_WORKER_CONCURRENCY, worker_id=None, membership=None, max_async_jobs=JOB_MAX_ASYNC_JOBS):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self._async_slots = threading.BoundedSemaphore(max_async_jobs)
+        self.membership = membership
+        self.worker_id = worker_id or (membership.instance_id if membership else f"{socket.gethostname()}-{os.getpid()}")
+        self._stop = threading.Event()
+        self._threads = []
+        self._running_jobs = {}
+        self._revoked_jobs = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._work_loop, name=f"worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        print(f"[FILA] Worker {self.worker_id} iniciado com {self.concurrency} thread(s).")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            try:
+                client_ids = self.membership.owned_client_ids() if self.membership else None
+                job = db.claim_job(self.worker_id, JOB_LEASE_SECONDS, tasks=list(self.handlers), client_ids=client_ids)
+            except Exception as e:
+                print(f"[ERRO FILA] Falha ao reservar job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(JOB_POLL_SECONDS)
+                continue
+            self.run_job(job)
+
+    def stop_requested(self, job_id):
+        """True se o job deve parar (o cliente passou para outro shard)."""
+        with self._running_lock:
+            return job_id in self._revoked_jobs
+
+    def run_job(self, job):
+        """
+        Executa o job. Handlers assíncronos são entregues ao event loop e o
+        resultado é gravado quando a corrotina termina (run_job retorna antes).
+        """
+        with self._running_lock:
+            self._running_jobs[job['id']] = job['client_id']
+        handler = self.handlers[job['task']]
+        if inspect.iscoroutinefunction(handler):
+            self._async_slots.acquire()
+            future = get_engine().submit(self._run_async(job, handler))
+            future.add_done_callback(lambda _: self._async_slots.release())
+            return
+
+        token = _current_job.set((self, job['id']))
+        try:
+            if job['client_id'] is not None:
+                handler(job['client_id'])
+            else:
+                handler()
+        except Exception as e:
+            traceback.print_exc()
+            self._finish_job(job, e)
+        else:
+            self._finish_job(job, None)
+        finally:
+            _current_job.reset(token)
+
+    async def _run_async(self, job, handler):
+        # A tarefa do loop tem o próprio contexto: current_stop_check funciona dentro dela
+        _current_job.set((self, job['id']))
+        try:
+            if job['client_id'] is not None:
+                await handler(job['client_id'])
+            else:
+                await handler()
+        except Exception as e:
+            traceback.print_exc()
+            await run_blocking(self._finish_job, job, e)
+        else:
+            await run_blocking(self._finish_job, job, None)
+
+    def _finish_job(self, job, error):
+        try:
+            if error is None:
+                db.complete_job(job['id'], self.worker_id)
+                return
+            db.fail_job(job['id'], self.worker_id, str(error), JOB_RETRY_BACKOFF_SECONDS)
+            if job['client_id'] is not None:
+                outcome = 'nova_tentativa' if job['attempts'] < job['max_attempts'] else 'falha'
+                metrics.CLIENT_OPERATIONS.inc(client_id=job['client_id'], operation=f"job_{job['task']}", outcome=outcome)
+            db.log_event("Erro Crítico", f"Job '{job['task']}' (tentativa {job['attempts']}) falhou: {error}", user_id=job['client_id'])
+        finally:
+            with self._running_lock:
+                self._running_jobs.pop(job['id'], None)
+                self._revoked_jobs.discard(job['id'])
+
+    def _heartbeat_loop(self):
+        # Renova o lease dos jobs em execução bem antes de ele vencer
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            with self._running_lock:
+                job_ids = list(self._running_jobs)
+                if self.membership:
+                    # Jobs de clientes que mudaram de shard são avisados para parar;
+                    # o lease continua sendo renovado até o handler retornar.
+                    for job_id, client_id in self._running_jobs.items():
+                        if client_id is not None and job_id not in self._revoked_jobs and not self.membership.owns(client_id):
+                            self._revoked_jobs.add(job_id)
+                            print(f"[FILA] Cliente {client_id} mudou de shard; job {job_id} será interrompido.")
+            try:
+                db.renew_job_leases(self.worker_id, job_ids, JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"[ERRO FILA] Falha ao renovar leases: {e}")
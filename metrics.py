@@ -0,0 +1,231 @@
+# metrics.py - Instrumentação (contadores, gauges e histogramas) no formato do Prometheus
+#
+# Implementação mínima, sem dependências: cada processo (agente, painéis) mantém
+# suas métricas em memória e as expõe em texto no formato de exposição do
+# Prometheus, pelo /metrics do painel admin ou pelo servidor lateral do agente.
+
+import hmac
+import time
+import inspect
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites (em segundos) das faixas dos histogramas de duração
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Métrica {self.name} espera os rótulos {self.labelnames}, recebeu {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in self._values.items()]
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def time(self, **labels):
+        """Context manager que registra a duração do bloco."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                le = (('le', _format_number(float(bound))),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+def timed(histogram, **labels):
+    """Decorador que registra a duração de cada chamada (funções síncronas ou async)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def render():
+    """Todas as métricas do processo no formato de texto do Prometheus."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+def token_matches(authorization, token):
+    """Confere o cabeçalho "Authorization: Bearer <token>". Sem token configurado, nunca confere."""
+    if not token or not authorization:
+        return False
+    scheme, _, value = authorization.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(value.strip().encode('utf-8'), token.encode('utf-8'))
+
+def start_http_server(port, token, host='0.0.0.0'):
+    """
+    Servidor lateral (thread própria) que responde /metrics; usado pelo agente.
+    Só responde a quem enviar o `token` no cabeçalho Authorization.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            if not token_matches(self.headers.get('Authorization'), token):
+                self.send_response(401)
+                self.send_header('WWW-Authenticate', 'Bearer')
+                self.end_headers()
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+# --- MÉTRICAS DO NEWSBOT ---
+
+OPERATION_SECONDS = Histogram(
+    'newsbot_operation_seconds',
+    'Duração das etapas do agente (coleta, score, login, publicação, envio SMTP).',
+    ['operation']
+)
+DB_CALL_SECONDS = Histogram(
+    'newsbot_db_call_seconds',
+    'Duração de cada chamada às funções de database.py.',
+    ['function']
+)
+CLIENT_OPERATIONS = Counter(
+    'newsbot_client_operations_total',
+    'Resultados por cliente e etapa (sucesso, falha ou nova tentativa).',
+    ['client_id', 'operation', 'outcome']
+)
+CLIENT_LAST_RUN_SECONDS = Gauge(
+    'newsbot_client_last_run_seconds',
+    'Duração da última coleta/score/login de cada cliente na tarefa de publicação.',
+    ['client_id']
+)
+LOG_EVENTS_DROPPED = Counter(
+    'newsbot_log_events_dropped_total',
+    'Eventos de log descartados porque o lote falhou ao ser gravado mesmo após nova tentativa.'
+)
+WORDPRESS_FETCHES = Counter(
+    'newsbot_wordpress_fetches_total',
+    'Coletas de sites do WordPress por resultado: requisicao (enviada), nao_modificado (304), '
+    'falha, cache_recente (sem requisição) e agrupado (esperou a coleta de outro cliente).',
+    ['outcome']
+)
+WORDPRESS_RETRIES = Counter(
+    'newsbot_wordpress_retries_total',
+    'Novas tentativas de requisição ao WordPress, por host.',
+    ['host']
+)
+
+def record_client(client_id, operation, success):
+    CLIENT_OPERATIONS.inc(client_id=client_id, operation=operation, outcome='sucesso' if success else 'falha')
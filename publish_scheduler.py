@@ -0,0 +1,107 @@
+# publish_scheduler.py - Agendador das publicações no Instagram
+#
+# Cada cliente vira uma cadeia de publicações pendentes, executada como
+# corrotina no event loop do agente (async_engine). O job do cliente espera a
+# cadeia terminar: o lease na fila vale até a última publicação, e um job que
+# cai no meio volta para a fila. Quando o limite da conta
+# (rate_limiter) ainda não permite publicar, a cadeia espera com asyncio.sleep;
+# nenhuma thread fica parada durante a pausa. As chamadas bloqueantes (banco,
+# instagrapi) vão para o executor do loop.
+
+import time
+import asyncio
+import threading
+
+import database as db
+import instagram_client
+import rate_limiter
+import metrics
+from async_engine import run_blocking
+from config import PUBLISH_FAILURE_PAUSE_SECONDS, BLOCK_DUPLICATE_STORIES_PER_ACCOUNT
+
+class PublishScheduler:
+    """Executa as cadeias de publicação dos clientes respeitando os limites por conta."""
+
+    # Intervalo máximo (em segundos) entre as verificações de `should_stop` durante uma espera
+    STOP_CHECK_SECONDS = 30
+
+    async def publish(self, client, insta_api, noticias, deadline, should_stop=None):
+        """
+        Publica as `noticias` (já filtradas e em ordem de prioridade) do cliente e
+        só retorna quando a cadeia termina, para que o job da fila continue
+        reservado enquanto houver publicações pendentes. `deadline` é um
+        time.monotonic(); `should_stop` (opcional) interrompe a cadeia entre
+        publicações, por exemplo quando o cliente passa para outro shard.
+        """
+        if noticias:
+            await self._chain(client, insta_api, list(noticias), deadline, should_stop or (lambda: False))
+
+    async def _sleep(self, seconds, should_stop):
+        # Espera em fatias curtas para perceber um pedido de parada no meio da pausa
+        end = time.monotonic() + seconds
+        while not should_stop():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, self.STOP_CHECK_SECONDS))
+
+    async def _chain(self, client, insta_api, noticias, deadline, should_stop):
+        try:
+            while noticias:
+                if should_stop():
+                    db.log_event("Tarefa de Publicação", f"Publicações de {client['username']} interrompidas: o cliente não pertence mais a esta instância.", user_id=client['id'])
+                    break
+                if time.monotonic() >= deadline:
+                    db.log_event("Tarefa de Publicação", f"Prazo da rodada esgotado para {client['username']}.", user_id=client['id'])
+                    break
+
+                wait_seconds = await run_blocking(rate_limiter.wait_time, client['instagram_user'])
+                if wait_seconds > 0:
+                    if time.monotonic() + wait_seconds >= deadline:
+                        db.log_event("Tarefa de Publicação", f"Limite da conta {client['instagram_user']} não libera publicações antes do prazo da rodada.", user_id=client['id'])
+                        break
+                    minutes, seconds = divmod(int(wait_seconds), 60)
+                    print(f"[INFO] Próxima publicação de {client['instagram_user']} em {minutes} minutos e {seconds} segundos.")
+                    await self._sleep(wait_seconds, should_stop)
+                    continue
+
+                # A reserva atômica impede que execuções simultâneas publiquem a mesma notícia
+                # (e, com a trava por conta, a mesma notícia sob outro post ID). Ela vem antes
+                # da cota: uma notícia já reservada não gasta publicação da conta.
+                noticia = noticias[0]
+                account = client['instagram_user'] if BLOCK_DUPLICATE_STORIES_PER_ACCOUNT else None
+                if not await run_blocking(db.claim_published_post, client['id'], noticia['id'], noticia.get('fingerprint_id'), account):
+                    noticias.pop(0)
+                    continue
+
+                acquired_at = time.time()
+                if await run_blocking(rate_limiter.try_acquire, client['instagram_user'], acquired_at) > 0:
+                    # Outro processo usou a cota desde a consulta: desfaz a reserva e volta a esperar
+                    await run_blocking(db.release_published_post, client['id'], noticia['id'])
+                    continue
+                noticias.pop(0)
+
+                print(f"\n[INSTAGRAM] Tentando publicar: '{noticia['title']}'")
+                success = await run_blocking(instagram_client.post_to_instagram, insta_api, noticia)
+
+                metrics.record_client(client['id'], 'publicacao', success)
+                if success:
+                    db.log_event("Publicação Instagram", f"Sucesso ao publicar '{noticia['title']}' para {client['username']}.", user_id=client['id'])
+                else:
+                    await run_blocking(db.release_published_post, client['id'], noticia['id'])
+                    db.log_event("Erro de Publicação", f"Falha ao publicar '{noticia['title']}' para {client['username']}.", user_id=client['id'])
+                    # A falha não gasta cota; a conta só espera a pausa de falha
+                    await run_blocking(rate_limiter.refund, client['instagram_user'], acquired_at, PUBLISH_FAILURE_PAUSE_SECONDS)
+        except Exception as e:
+            db.log_event("Erro Crítico", f"Erro na publicação do cliente {client['username']}: {str(e)}", user_id=client['id'])
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Agendador compartilhado pelo processo (criado na primeira chamada)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PublishScheduler()
+        return _scheduler
@@ -0,0 +1,111 @@
+# rate_limiter.py - Limite de publicações por conta do Instagram
+#
+# Token bucket por conta (cota por hora), contador diário e espaçamento mínimo
+# aleatório entre publicações (PAUSE_MIN/MAX_MINUTES). O estado fica na tabela
+# instagram_rate_limits, então os limites valem entre reinícios e entre processos.
+
+import time
+import random
+from datetime import datetime, timezone, timedelta
+
+import database as db
+from config import (
+    INSTAGRAM_POSTS_PER_HOUR, INSTAGRAM_POSTS_PER_DAY,
+    PAUSE_MIN_MINUTES, PAUSE_MAX_MINUTES
+)
+
+def _utc_day(now):
+    return datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%d')
+
+def _seconds_until_next_day(now):
+    current = datetime.fromtimestamp(now, timezone.utc)
+    tomorrow = (current + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - current).total_seconds()
+
+def _current_state(state, now):
+    """Tokens e contador do dia atualizados até `now`, e a espera (0 se há cota)."""
+    refill_per_second = INSTAGRAM_POSTS_PER_HOUR / 3600
+    tokens = min(INSTAGRAM_POSTS_PER_HOUR, state['tokens'] + (now - state['refreshed_at']) * refill_per_second)
+    day_count = state['day_count'] if state['day'] == _utc_day(now) else 0
+
+    waits = [0]
+    if state['next_allowed_at'] > now:
+        waits.append(state['next_allowed_at'] - now)
+    if tokens < 1:
+        waits.append((1 - tokens) / refill_per_second)
+    if day_count >= INSTAGRAM_POSTS_PER_DAY:
+        waits.append(_seconds_until_next_day(now))
+    return tokens, day_count, max(waits)
+
+def wait_time(instagram_user, now=None):
+    """Segundos até a conta ter cota para publicar (0 se já tem), sem consumir nada."""
+    now = time.time() if now is None else now
+    with db.db_connection() as conn:
+        state = conn.execute(
+            "SELECT * FROM instagram_rate_limits WHERE instagram_user = ?", (instagram_user,)
+        ).fetchone()
+    if state is None:
+        return 0
+    return _current_state(state, now)[2]
+
+def try_acquire(instagram_user, now=None):
+    """
+    Tenta consumir uma publicação da cota da conta.
+    Retorna 0 se a publicação foi liberada, ou quantos segundos faltam para a conta
+    ter cota de novo (nada é consumido nesse caso).
+    """
+    now = time.time() if now is None else now
+    today = _utc_day(now)
+
+    with db.db_connection() as conn:
+        # O INSERT inicial já reserva o lock de escrita: leitura e atualização
+        # do estado acontecem sem que outro processo intercale entre elas.
+        conn.execute(
+            "INSERT OR IGNORE INTO instagram_rate_limits (instagram_user, tokens, refreshed_at, day) VALUES (?, ?, ?, ?)",
+            (instagram_user, INSTAGRAM_POSTS_PER_HOUR, now, today)
+        )
+        state = conn.execute(
+            "SELECT * FROM instagram_rate_limits WHERE instagram_user = ?", (instagram_user,)
+        ).fetchone()
+
+        tokens, day_count, wait = _current_state(state, now)
+
+        if wait > 0:
+            conn.execute(
+                "UPDATE instagram_rate_limits SET tokens = ?, refreshed_at = ?, day = ?, day_count = ? WHERE instagram_user = ?",
+                (tokens, now, today, day_count, instagram_user)
+            )
+            return wait
+
+        # Espaçamento aleatório até a próxima publicação da mesma conta
+        pause = random.randint(PAUSE_MIN_MINUTES * 60, PAUSE_MAX_MINUTES * 60)
+        conn.execute(
+            """
+            UPDATE instagram_rate_limits
+            SET tokens = ?, refreshed_at = ?, day = ?, day_count = ?, next_allowed_at = ?
+            WHERE instagram_user = ?
+            """,
+            (tokens - 1, now, today, day_count + 1, now + pause, instagram_user)
+        )
+        return 0
+
+def refund(instagram_user, acquired_at, pause_seconds, now=None):
+    """
+    Devolve a publicação consumida por `try_acquire(..., now=acquired_at)` que
+    falhou: o token e o contador do dia voltam, e a próxima tentativa da conta
+    fica para daqui a `pause_seconds` em vez do espaçamento aleatório sorteado.
+    Se outra publicação da conta mexeu no estado desde então, o espaçamento dela
+    é mantido.
+    """
+    now = time.time() if now is None else now
+    with db.db_connection() as conn:
+        conn.execute(
+            """
+            UPDATE instagram_rate_limits SET
+                tokens = min(?, tokens + 1),
+                day_count = CASE WHEN day = ? AND day_count > 0 THEN day_count - 1 ELSE day_count END,
+                next_allowed_at = CASE WHEN refreshed_at = ? THEN ? ELSE max(next_allowed_at, ?) END
+            WHERE instagram_user = ?
+            """,
+            (INSTAGRAM_POSTS_PER_HOUR, _utc_day(acquired_at), acquired_at, now + pause_seconds, now + pause_seconds, instagram_user)
+        )
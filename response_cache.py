@@ -0,0 +1,110 @@
+# response_cache.py - Cache das respostas JSON dos painéis (admin e cliente)
+#
+# A chave de cada resposta inclui o endpoint, os parâmetros e a versão atual
+# dos escopos de dados de que ela depende (tabela cache_versions). Qualquer
+# escrita relevante no banco incrementa essas versões, então a resposta antiga
+# simplesmente deixa de ser encontrada, mesmo que a escrita venha do agente
+# rodando em outro processo. A mesma chave serve de ETag para o navegador.
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+import database as db
+from config import RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_URL
+
+class MemoryBackend:
+    """LRU em memória com expiração por TTL."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body, ttl):
+        with self._lock:
+            self._entries[key] = (body, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisBackend:
+    """Backend compartilhado entre processos (pacote redis, opcional)."""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        body = self._client.get(f"newsbot:resposta:{key}")
+        return body.decode('utf-8') if body is not None else None
+
+    def set(self, key, body, ttl):
+        self._client.set(f"newsbot:resposta:{key}", body, ex=max(1, int(ttl)))
+
+def _create_backend():
+    if RESPONSE_CACHE_URL:
+        try:
+            return RedisBackend(RESPONSE_CACHE_URL)
+        except Exception as e:
+            print(f"[ERRO CACHE] Backend compartilhado indisponível ({e}); usando cache em memória.")
+    return MemoryBackend()
+
+_backend = _create_backend()
+# Um lock por chave: quando muitos navegadores pedem a mesma resposta ao mesmo
+# tempo, só um deles monta o payload e os demais reaproveitam o resultado.
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+def _build_lock(key):
+    with _build_locks_guard:
+        if len(_build_locks) > RESPONSE_CACHE_MAX_ENTRIES:
+            _build_locks.clear()
+        return _build_locks.setdefault(key, threading.Lock())
+
+def cached_json(endpoint, user_ids, build, ttl=RESPONSE_CACHE_TTL_SECONDS):
+    """
+    Responde com o JSON de `build()`, reaproveitando a resposta em cache enquanto
+    os dados dos clientes em `user_ids` não mudarem (None = escopo global, usado
+    pelos gráficos que agregam todos os clientes). Responde 304 quando o
+    navegador já tem a versão atual (If-None-Match).
+    """
+    scopes = [db.CACHE_SCOPE_GLOBAL if user_id is None else db.cache_scope_for_user(user_id) for user_id in user_ids]
+    versions = db.get_cache_versions(scopes)
+    raw_key = json.dumps([endpoint, request.query_string.decode('utf-8'), scopes, versions])
+    key = hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+
+    if request.if_none_match.contains(key):
+        response = Response(status=304)
+    else:
+        body = _backend.get(key)
+        if body is None:
+            with _build_lock(key):
+                body = _backend.get(key)
+                if body is None:
+                    # Todas as consultas do payload reaproveitam a mesma conexão do pool
+                    with db.db_connection():
+                        body = json.dumps(build(), ensure_ascii=False, default=str)
+                    _backend.set(key, body, ttl)
+        response = Response(body, mimetype='application/json')
+
+    response.set_etag(key)
+    # O navegador guarda a resposta, mas sempre revalida com o ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
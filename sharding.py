@@ -0,0 +1,72 @@
+# sharding.py - Partição dos clientes entre várias instâncias do agente
+#
+# Cada instância registra um heartbeat na tabela agent_instances. Os clientes
+# são distribuídos entre as instâncias vivas por rendezvous hashing (maior peso
+# de hash para o par instância/cliente): a partição é estável e, quando uma
+# instância entra ou morre, só os clientes dela mudam de dono.
+
+import os
+import socket
+import hashlib
+import threading
+
+import database as db
+from config import SHARD_HEARTBEAT_SECONDS, SHARD_INSTANCE_TTL_SECONDS
+
+def _weight(instance_id, client_id):
+    digest = hashlib.blake2b(f"{instance_id}:{client_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+def owner_of(client_id, instance_ids):
+    """Instância dona do cliente entre as `instance_ids` vivas (None se não houver nenhuma)."""
+    if not instance_ids:
+        return None
+    return max(instance_ids, key=lambda instance_id: _weight(instance_id, client_id))
+
+class ShardMembership:
+    """
+    Participação desta instância no grupo de agentes. Mantém o heartbeat e uma
+    visão em cache dos clientes que pertencem a esta instância.
+    """
+
+    def __init__(self, instance_id=None):
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._owned_client_ids = []
+        self._live_instances = []
+
+    def start(self):
+        self.refresh()
+        threading.Thread(target=self._heartbeat_loop, name="shard-heartbeat", daemon=True).start()
+        print(f"[SHARD] Instância {self.instance_id} ativa com {len(self._owned_client_ids)} cliente(s) "
+              f"entre {len(self._live_instances)} instância(s).")
+
+    def stop(self):
+        self._stop.set()
+        db.remove_agent_instance(self.instance_id)
+
+    def refresh(self):
+        db.heartbeat_agent_instance(self.instance_id)
+        live = sorted(set(db.get_live_agent_instances(SHARD_INSTANCE_TTL_SECONDS)) | {self.instance_id})
+        owned = [client_id for client_id in db.get_active_client_ids() if owner_of(client_id, live) == self.instance_id]
+        with self._lock:
+            if live != self._live_instances and self._live_instances:
+                print(f"[SHARD] Rebalanceamento: {len(live)} instância(s) viva(s), {len(owned)} cliente(s) nesta instância.")
+            self._live_instances = live
+            self._owned_client_ids = owned
+
+    def owned_client_ids(self):
+        with self._lock:
+            return list(self._owned_client_ids)
+
+    def owns(self, client_id):
+        with self._lock:
+            return client_id in self._owned_client_ids
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(SHARD_HEARTBEAT_SECONDS):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[ERRO SHARD] Falha no heartbeat da instância {self.instance_id}: {e}")
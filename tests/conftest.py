@@ -0,0 +1,22 @@
+# conftest.py - Configuração comum dos testes
+#
+# Os módulos do projeto ficam na raiz do repositório (sem pacote); cada teste
+# que usa o banco recebe um agente.db temporário e um pool de conexões novo.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_NAME', str(tmp_path / 'agente.db'))
+    monkeypatch.setattr(db, '_pool', None)
+    db.create_tables()
+    yield db
+    db.flush_logs()
+    db.get_pool().close_all()
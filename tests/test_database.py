@@ -0,0 +1,92 @@
+import pytest
+
+def test_legacy_log_backfill_matches_usernames_with_spaces(temp_db):
+    for username in ('CLAUDIO', 'CLAUDIO DA HORA', 'ana'):
+        temp_db.add_user(username, 'senha')
+    ids = {username: temp_db.get_user(username)['id'] for username in ('CLAUDIO', 'CLAUDIO DA HORA', 'ana')}
+    messages = [
+        "Iniciando para o cliente CLAUDIO DA HORA.",
+        "Falha ao enviar relatório para CLAUDIO DA HORA: timeout",
+        "Relatório enviado para CLAUDIO em claudio@site.test.",
+        "Publicação 'Notícia para ana' para CLAUDIO DA HORA",
+        "Nenhuma notícia encontrada para ana.",
+        "Nenhuma notícia encontrada para desconhecido.",
+    ]
+    with temp_db.db_connection() as conn:
+        conn.executemany("INSERT INTO event_logs (event_type, message) VALUES ('Legado', ?)", [(m,) for m in messages])
+        temp_db._backfill_event_log_users(conn)
+        found = [row['user_id'] for row in conn.execute("SELECT user_id FROM event_logs WHERE event_type = 'Legado' ORDER BY id")]
+
+    assert found == [ids['CLAUDIO DA HORA'], ids['CLAUDIO DA HORA'], ids['CLAUDIO'], ids['CLAUDIO DA HORA'], ids['ana'], None]
+
+def test_decode_cursor_rejects_non_scalar_values(temp_db):
+    assert temp_db.decode_cursor(temp_db.encode_cursor(['2024-01-01 00:00:00', 7]), 2) == ['2024-01-01 00:00:00', 7]
+    for values in ([[1], 2], [{'a': 1}, 2], [None, 2], [True, 2]):
+        with pytest.raises(ValueError):
+            temp_db.decode_cursor(temp_db.encode_cursor(values), 2)
+
+def test_logs_route_answers_400_for_malformed_cursor(temp_db):
+    import admin_painel
+    client = admin_painel.app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = 1
+    response = client.get('/api/logs', query_string={'after': temp_db.encode_cursor([['x'], 1])})
+    assert response.status_code == 400
+
+def test_client_logs_only_invalidate_the_client_cache_scope(temp_db):
+    temp_db.add_user('cliente', 'senha')
+    user_id = temp_db.get_user('cliente')['id']
+    scopes = [temp_db.CACHE_SCOPE_GLOBAL, temp_db.cache_scope_for_user(user_id)]
+    global_before, client_before = temp_db.get_cache_versions(scopes)
+
+    temp_db.log_event("Coleta WordPress", "Nenhuma notícia encontrada para cliente.", user_id=user_id)
+    temp_db.log_event("Tarefa de Publicação", "Nenhum cliente ativo encontrado.")
+    temp_db.flush_logs()
+    global_after, client_after = temp_db.get_cache_versions(scopes)
+    assert global_after == global_before
+    assert client_after > client_before
+
+    temp_db.log_event(temp_db.PUBLISH_ERROR_EVENT, "Falha no login do Instagram para cliente.", user_id=user_id)
+    temp_db.flush_logs()
+    assert temp_db.get_cache_versions(scopes)[0] > global_after
+
+def _flaky_writer(temp_db, monkeypatch, failures):
+    monkeypatch.setattr(temp_db, 'LOG_RETRY_DELAY_SECONDS', 0)
+    writer = temp_db.EventLogWriter()
+    insert = writer._insert
+    attempts = []
+
+    def flaky_insert(batch):
+        attempts.append(len(batch))
+        if len(attempts) <= failures:
+            raise temp_db.sqlite3.OperationalError('database is locked')
+        insert(batch)
+
+    monkeypatch.setattr(writer, '_insert', flaky_insert)
+    return writer, attempts
+
+def _event_count(temp_db):
+    with temp_db.db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM event_logs WHERE event_type = 'Teste'").fetchone()[0]
+
+def test_log_batch_is_retried_once_after_a_failure(temp_db, monkeypatch):
+    import metrics
+    writer, attempts = _flaky_writer(temp_db, monkeypatch, failures=1)
+    dropped_before = metrics.LOG_EVENTS_DROPPED._values.get((), 0)
+
+    writer._write([('2024-01-01 00:00:00', 'Teste', 'mensagem', None, 'info')] * 3)
+
+    assert attempts == [3, 3]
+    assert _event_count(temp_db) == 3
+    assert metrics.LOG_EVENTS_DROPPED._values.get((), 0) == dropped_before
+
+def test_log_batch_failing_twice_is_counted_as_dropped(temp_db, monkeypatch):
+    import metrics
+    writer, attempts = _flaky_writer(temp_db, monkeypatch, failures=2)
+    dropped_before = metrics.LOG_EVENTS_DROPPED._values.get((), 0)
+
+    writer._write([('2024-01-01 00:00:00', 'Teste', 'mensagem', None, 'info')] * 3)
+
+    assert attempts == [3, 3]
+    assert _event_count(temp_db) == 0
+    assert metrics.LOG_EVENTS_DROPPED._values.get((), 0) == dropped_before + 3
@@ -0,0 +1,79 @@
+import socket
+
+import pytest
+
+pytest.importorskip('aiosmtpd')
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+import email_client
+
+class Recorder:
+    """Handler do aiosmtpd que guarda os destinatários aceitos e recusa os de @recusado."""
+
+    def __init__(self):
+        self.delivered = []
+        # Conexões que tentaram autenticar (smtplib tenta cada mecanismo na mesma conexão)
+        self.logins = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith('@recusado.test'):
+            return '550 destinatario inexistente'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.extend(envelope.rcpt_tos)
+        return '250 mensagem aceita'
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    recorder = Recorder()
+
+    def authenticator(server, session, envelope, mechanism, auth_data):
+        recorder.logins.add(session.peer)
+        return AuthResult(success=auth_data.password == b'senha', handled=False)
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    controller = Controller(recorder, hostname='127.0.0.1', port=port, authenticator=authenticator, auth_require_tls=False)
+    controller.start()
+
+    class LocalSMTPConnection(email_client.SMTPConnection):
+        def __init__(self, sender, password):
+            super().__init__(sender, password, host='127.0.0.1', port=port)
+
+    monkeypatch.setattr(email_client, 'EMAIL_USE_TLS', False)
+    monkeypatch.setattr(email_client, 'EMAIL_MAX_CONNECTIONS', 1)
+    monkeypatch.setattr(email_client, 'SMTPConnection', LocalSMTPConnection)
+    yield recorder
+    controller.stop()
+
+def _reports(*recipients):
+    news = [{'title': 'Notícia', 'score': 1.0, 'link': 'http://site/1'}]
+    return [{'recipient': recipient, 'top_news': news} for recipient in recipients]
+
+def test_refused_recipient_fails_alone_without_reconnecting(smtp_server):
+    results = email_client.send_reports('bot@site.test', 'senha', _reports('a@site.test', 'x@recusado.test', 'b@site.test'))
+
+    assert [result['success'] for result in results] == [True, False, True]
+    assert smtp_server.delivered == ['a@site.test', 'b@site.test']
+    assert len(smtp_server.logins) == 1
+
+def test_rejected_credentials_abort_the_batch(smtp_server):
+    results = email_client.send_reports('bot@site.test', 'errada', _reports('a@site.test', 'b@site.test', 'c@site.test'))
+
+    assert not any(result['success'] for result in results)
+    assert smtp_server.delivered == []
+    assert len(smtp_server.logins) == 1
+
+def test_dropped_session_is_reopened(smtp_server):
+    msg = email_client.build_report_message('bot@site.test', 'a@site.test', _reports('a@site.test')[0]['top_news'])
+    with email_client.SMTPConnection('bot@site.test', 'senha') as connection:
+        connection.send(msg)
+        connection._server.close()
+        connection.send(msg)
+
+    assert smtp_server.delivered == ['a@site.test', 'a@site.test']
+    assert len(smtp_server.logins) == 2
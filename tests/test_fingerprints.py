@@ -0,0 +1,34 @@
+import fingerprints
+
+def _noticia(post_id, title, date, link=None):
+    return {'id': post_id, 'title': title, 'date': date, 'link': link or f'http://site/{post_id}'}
+
+def _ids(noticias):
+    return [noticia['fingerprint_id'] for noticia in fingerprints.annotate(noticias)]
+
+def test_syndicated_copy_on_same_day_is_merged(temp_db):
+    original = _ids([_noticia(1, 'Governo anuncia novo pacote de obras para rodovias de Mato Grosso', '2024-03-04T10:00:00Z')])
+    copia = _ids([_noticia(7, 'Governo anuncia novo pacote de obras para as rodovias de Mato Grosso', '2024-03-04T13:30:00Z', 'http://outro/7')])
+    assert copia == original
+
+def test_exact_copy_in_another_site_is_merged(temp_db):
+    original = _ids([_noticia(1, 'Câmara aprova reajuste dos servidores', '2024-03-04T10:00:00Z')])
+    copia = _ids([_noticia(9, 'CÂMARA aprova reajuste dos servidores!', '2024-03-04T11:00:00Z', 'http://outro/9')])
+    assert copia == original
+
+def test_daily_quote_headlines_stay_distinct(temp_db):
+    alta = _ids([_noticia(1, 'Cotação do dólar hoje fecha em alta em Cuiabá', '2024-03-04T18:00:00Z')])
+    baixa = _ids([_noticia(2, 'Cotação do dólar hoje fecha em baixa em Cuiabá', '2024-03-04T18:05:00Z')])
+    assert alta != baixa
+
+def test_weather_forecasts_for_different_days_stay_distinct(temp_db):
+    segunda = _ids([_noticia(1, 'Previsão do tempo para Cuiabá nesta segunda-feira', '2024-03-04T06:00:00Z')])
+    terca = _ids([_noticia(2, 'Previsão do tempo para Cuiabá nesta terça-feira', '2024-03-05T06:00:00Z')])
+    assert segunda != terca
+
+def test_recurring_headline_a_week_later_is_a_new_story(temp_db):
+    semana = _ids([_noticia(1, 'Previsão do tempo para Cuiabá nesta segunda-feira', '2024-03-04T06:00:00Z')])
+    seguinte = _ids([_noticia(2, 'Previsão do tempo para Cuiabá nesta segunda-feira', '2024-03-11T06:00:00Z')])
+    assert semana != seguinte
+    # A mesma notícia vista de novo na rodada seguinte continua reconhecida
+    assert _ids([_noticia(2, 'Previsão do tempo para Cuiabá nesta segunda-feira', '2024-03-11T06:00:00Z')]) == seguinte
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+import instagram_client
+
+class FakeClient:
+    """Client do instagrapi com sessão numerada; `failure` é levantada ao revalidar."""
+
+    failure = None
+    logins = 0
+
+    def __init__(self):
+        self.settings = {'uuids': {'uuid': 'aparelho'}}
+
+    def login(self, username, password):
+        FakeClient.logins += 1
+        self.settings = dict(self.settings, session=FakeClient.logins)
+        return True
+
+    def get_settings(self):
+        return dict(self.settings)
+
+    def set_settings(self, settings):
+        self.settings = dict(settings)
+
+    def set_uuids(self, uuids):
+        self.settings['uuids'] = uuids
+
+    def get_timeline_feed(self):
+        if FakeClient.failure:
+            raise FakeClient.failure
+        return {}
+
+@pytest.fixture
+def instagram(temp_db, monkeypatch):
+    monkeypatch.setattr(instagram_client, 'Client', FakeClient)
+    monkeypatch.setattr(instagram_client, '_fernet', Fernet(Fernet.generate_key()))
+    monkeypatch.setattr(FakeClient, 'failure', None)
+    monkeypatch.setattr(FakeClient, 'logins', 0)
+    instagram_client._live_clients.clear()
+    yield instagram_client
+    instagram_client._live_clients.clear()
+
+def _saved_session(username):
+    return instagram_client._load_session(username)
+
+def test_saved_session_failing_with_any_error_is_replaced(instagram):
+    instagram.login('conta', 'senha')
+    instagram._live_clients.clear()
+    FakeClient.failure = RuntimeError('challenge_required')
+
+    cl = instagram.login('conta', 'senha')
+
+    assert cl is not None
+    assert FakeClient.logins == 2
+    assert _saved_session('conta')['session'] == 2
+
+def test_cached_client_failing_revalidation_discards_both_sessions(instagram):
+    first = instagram.login('conta', 'senha')
+    instagram._live_clients['conta'] = (first, time.monotonic() - 10**6)
+    FakeClient.failure = ConnectionError('conexão recusada')
+
+    cl = instagram.login('conta', 'senha')
+
+    assert cl is not first
+    assert FakeClient.logins == 2
+    assert cl.get_settings()['uuids'] == {'uuid': 'aparelho'}
+    assert _saved_session('conta')['session'] == 2
+
+def test_without_session_key_nothing_is_saved(instagram, monkeypatch):
+    monkeypatch.setattr(instagram_client, '_fernet', None)
+
+    assert instagram.login('conta', 'senha') is not None
+    assert instagram_client.db.get_instagram_session('conta') is None
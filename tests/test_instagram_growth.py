@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+import database as db
+
+def test_downsample_keeps_extra_fields_and_limits_points():
+    points = [(x, (x * 37) % 101, f"dia-{x}") for x in range(500)]
+    sampled = db._downsample_lttb(points, 50)
+    assert len(sampled) == 50
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert all(len(point) == 3 for point in sampled)
+    assert [p[0] for p in sampled] == sorted(p[0] for p in sampled)
+
+def test_downsample_returns_short_series_unchanged():
+    points = [(x, x, str(x)) for x in range(10)]
+    assert db._downsample_lttb(points, 50) == points
+
+def test_growth_uses_daily_series_for_short_ranges(temp_db):
+    temp_db.add_user('cliente', 'senha')
+    user_id = temp_db.get_user('cliente')['id']
+    first_day = date(2026, 1, 1)
+    for offset in range(60):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        temp_db.save_instagram_stats_batch(day, [(user_id, 1000 + offset, 10, 5)])
+
+    growth = temp_db.get_user_instagram_growth(user_id, '2026-01-01', '2026-03-01')
+
+    assert len(growth) == 60
+    assert growth[0] == {'collection_date': '2026-01-01', 'followers_count': 1000}
+    assert growth[-1] == {'collection_date': '2026-03-01', 'followers_count': 1059}
+
+def test_growth_downsamples_rollup_buckets(temp_db):
+    temp_db.add_user('cliente', 'senha')
+    user_id = temp_db.get_user('cliente')['id']
+    first_day = date(2020, 1, 1)
+    for offset in range(0, 7 * 200, 7):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        temp_db.save_instagram_stats_batch(day, [(user_id, 1000 + offset, 10, 5)])
+
+    # ~46 meses com limite de 30 pontos: os agregados mensais são reduzidos pelo LTTB
+    growth = temp_db.get_user_instagram_growth(user_id, '2020-01-01', '2023-10-31', max_points=30)
+
+    assert len(growth) == 30
+    assert growth[0]['collection_date'].startswith('2020-01')
+    assert growth[-1]['collection_date'].startswith('2023-10')
+    assert all(set(point) == {'collection_date', 'followers_count'} for point in growth)
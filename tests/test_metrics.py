@@ -0,0 +1,42 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+def test_panel_metrics_require_admin_session_or_token(temp_db, monkeypatch):
+    import admin_painel
+    monkeypatch.setattr(admin_painel, 'METRICS_TOKEN', 'segredo')
+    client = admin_painel.app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer errado'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer segredo'}).status_code == 200
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = 1
+    assert client.get('/metrics').status_code == 200
+
+def test_panel_metrics_without_token_only_accept_sessions(temp_db, monkeypatch):
+    import admin_painel
+    monkeypatch.setattr(admin_painel, 'METRICS_TOKEN', None)
+    client = admin_painel.app.test_client()
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+
+def test_agent_metrics_server_requires_token():
+    server = metrics.start_http_server(0, 'segredo', host='127.0.0.1')
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url)
+        assert error.value.code == 401
+        request = urllib.request.Request(url, headers={'Authorization': 'Bearer segredo'})
+        assert urllib.request.urlopen(request).status == 200
+    finally:
+        server.shutdown()
+
+def test_check_password_is_not_timed_as_a_database_call(temp_db):
+    temp_db.add_user('cliente', 'senha')
+    before = metrics.render().count('function="check_password"')
+    assert temp_db.check_password('senha', temp_db.get_user('cliente')['password_hash'])
+    assert metrics.render().count('function="check_password"') == before == 0
@@ -0,0 +1,69 @@
+import time
+
+import instagram_client
+import publish_scheduler
+import rate_limiter
+from async_engine import get_engine
+
+def _client(db):
+    db.add_user('cliente', 'senha')
+    user_id = db.get_user('cliente')['id']
+    db.save_client_config(user_id, 'http://site', 'conta', 'senha', 'x@y.z', 0, '')
+    return db.get_active_client_config(user_id)
+
+def test_already_claimed_post_does_not_consume_quota(temp_db, monkeypatch):
+    client = _client(temp_db)
+    temp_db.claim_published_post(client['id'], 1)
+    published = []
+    monkeypatch.setattr(instagram_client, 'post_to_instagram', lambda api, noticia: published.append(noticia['id']) or True)
+    monkeypatch.setattr(rate_limiter, 'PAUSE_MIN_MINUTES', 0)
+    monkeypatch.setattr(rate_limiter, 'PAUSE_MAX_MINUTES', 0)
+
+    noticias = [{'id': 1, 'title': 'Já publicada'}, {'id': 2, 'title': 'Nova'}]
+    get_engine().run(publish_scheduler.PublishScheduler().publish(client, object(), noticias, time.monotonic() + 60))
+
+    assert published == [2]
+    with temp_db.db_connection() as conn:
+        state = conn.execute("SELECT * FROM instagram_rate_limits WHERE instagram_user = 'conta'").fetchone()
+    assert state['day_count'] == 1
+
+def test_stop_request_interrupts_chain(temp_db, monkeypatch):
+    client = _client(temp_db)
+    published = []
+    monkeypatch.setattr(instagram_client, 'post_to_instagram', lambda api, noticia: published.append(noticia['id']) or True)
+
+    noticias = [{'id': 1, 'title': 'Primeira'}, {'id': 2, 'title': 'Segunda'}]
+    get_engine().run(publish_scheduler.PublishScheduler().publish(client, object(), noticias, time.monotonic() + 60, lambda: bool(published)))
+
+    assert published == [1]
+
+def test_failed_post_refunds_quota_and_uses_failure_pause(temp_db, monkeypatch):
+    client = _client(temp_db)
+    attempts = []
+    monkeypatch.setattr(instagram_client, 'post_to_instagram', lambda api, noticia: attempts.append(noticia['id']) or False)
+    monkeypatch.setattr(rate_limiter, 'PAUSE_MIN_MINUTES', 10)
+    monkeypatch.setattr(rate_limiter, 'PAUSE_MAX_MINUTES', 10)
+    monkeypatch.setattr(publish_scheduler, 'PUBLISH_FAILURE_PAUSE_SECONDS', 60)
+
+    start = time.time()
+    noticias = [{'id': 1, 'title': 'Falha'}, {'id': 2, 'title': 'Seguinte'}]
+    # O prazo termina antes da pausa de falha: a cadeia para depois da primeira tentativa
+    get_engine().run(publish_scheduler.PublishScheduler().publish(client, object(), noticias, time.monotonic() + 30))
+
+    assert attempts == [1]
+    with temp_db.db_connection() as conn:
+        state = conn.execute("SELECT * FROM instagram_rate_limits WHERE instagram_user = 'conta'").fetchone()
+    assert state['day_count'] == 0
+    assert state['tokens'] == rate_limiter.INSTAGRAM_POSTS_PER_HOUR
+    assert start + 55 < state['next_allowed_at'] < time.time() + 65
+    assert temp_db.claim_published_post(client['id'], 1)
+
+def test_refund_keeps_the_pause_of_a_later_publication(temp_db):
+    assert rate_limiter.try_acquire('conta', now=1000.0) == 0
+    with temp_db.db_connection() as conn:
+        # Outra publicação da conta depois da que vai falhar
+        conn.execute("UPDATE instagram_rate_limits SET refreshed_at = 1500, next_allowed_at = 5000 WHERE instagram_user = 'conta'")
+    rate_limiter.refund('conta', 1000.0, 60, now=1600.0)
+    with temp_db.db_connection() as conn:
+        state = conn.execute("SELECT * FROM instagram_rate_limits WHERE instagram_user = 'conta'").fetchone()
+    assert state['next_allowed_at'] == 5000
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import wordpress_client as wp
+
+def _iso(hours_ago):
+    return (datetime.utcnow() - timedelta(hours=hours_ago)).strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
+
+def _noticias(*titles, hours_ago=1):
+    return [{'id': i, 'title': title, 'link': f'http://site/{i}', 'date': _iso(hours_ago)} for i, title in enumerate(titles)]
+
+def _client(keywords='', user_id=1):
+    return {'id': user_id, 'remix_niche_keywords': keywords}
+
+def test_recency_prefers_newer_news():
+    noticias = [
+        {'id': 1, 'title': 'Antiga', 'date': _iso(47)},
+        {'id': 2, 'title': 'Recente', 'date': _iso(0)},
+    ]
+    ranked = wp.calculate_engagement_scores(noticias)
+    assert [n['id'] for n in ranked] == [2, 1]
+    assert ranked[0]['score'] == pytest.approx(100.0, rel=0.01)
+    assert ranked[1]['score'] == pytest.approx(100.0 / 48, rel=0.01)
+
+def test_missing_or_invalid_dates_score_zero_recency():
+    noticias = [
+        {'id': 1, 'title': 'Sem data'},
+        {'id': 2, 'title': 'Data inválida', 'date': 'ontem'},
+        {'id': 3, 'title': 'Com data', 'date': _iso(0)},
+    ]
+    ranked = wp.calculate_engagement_scores(noticias)
+    scores = {n['id']: n['score'] for n in ranked}
+    assert ranked[0]['id'] == 3
+    assert scores[1] == scores[2] == 0.0
+
+def test_future_dates_do_not_exceed_fresh_news():
+    noticias = [{'id': 1, 'title': 'Agendada', 'date': _iso(-5)}]
+    assert wp.calculate_engagement_scores(noticias)[0]['score'] == pytest.approx(100.0)
+
+def test_keywords_match_whole_words_only():
+    noticias = _noticias(
+        'Novo horário do transporte em Cuiabá',
+        'Nível do Rio Cuiabá sobe após chuvas',
+        'Saúde pública amplia vacinação',
+        'Título sem relação',
+    )
+    scores = wp.keyword_component(noticias, None, _client('rio, saúde pública, t'))
+    assert list(scores) == pytest.approx([0.0, wp.KEYWORD_MAX_POINTS / 3, wp.KEYWORD_MAX_POINTS / 3, 0.0])
+
+def test_keywords_without_client_or_list_give_zero():
+    noticias = _noticias('Rio Cuiabá')
+    assert list(wp.keyword_component(noticias, None, None)) == [0.0]
+    assert list(wp.keyword_component(noticias, None, _client(' , '))) == [0.0]
+
+def test_history_rewards_terms_of_past_selections(temp_db):
+    temp_db.add_user('cliente', 'senha')
+    user_id = temp_db.get_user('cliente')['id']
+    temp_db.add_news_metric(user_id, 1, 'Eleições municipais em Cuiabá', 'http://site/1', 80.0)
+    temp_db.add_news_metric(user_id, 2, 'Previsão do tempo', 'http://site/2', 20.0)
+    noticias = _noticias('Debate das eleições', 'Tempo seco continua', 'Assunto novo')
+
+    scores = wp.history_component(noticias, None, _client(user_id=user_id))
+
+    assert list(scores) == pytest.approx([wp.HISTORY_MAX_POINTS, wp.HISTORY_MAX_POINTS * 20 / 80, 0.0])
+
+def test_history_without_client_or_metrics_gives_zero(temp_db):
+    noticias = _noticias('Qualquer')
+    assert list(wp.history_component(noticias, None, None)) == [0.0]
+    assert list(wp.history_component(noticias, None, _client(user_id=999))) == [0.0]
+
+def test_failing_component_is_ignored(monkeypatch):
+    def broken(noticias, ages_hours, client):
+        raise RuntimeError('falhou')
+    monkeypatch.setitem(wp.SCORE_COMPONENTS, 'broken', (broken, 1.0))
+    ranked = wp.calculate_engagement_scores(_noticias('Notícia', hours_ago=0))
+    assert ranked[0]['score'] == pytest.approx(100.0)
+
+@pytest.mark.parametrize('top_k, expected', [(0, []), (2, [4, 3]), (None, [4, 3, 2, 1, 0]), (10, [4, 3, 2, 1, 0])])
+def test_top_k(top_k, expected):
+    noticias = [{'id': i, 'title': f'Notícia {i}', 'date': _iso(10 - i)} for i in range(5)]
+    assert [n['id'] for n in wp.calculate_engagement_scores(noticias, top_k=top_k)] == expected
+
+def test_empty_list():
+    assert wp.calculate_engagement_scores([], top_k=3) == []
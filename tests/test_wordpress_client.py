@@ -0,0 +1,18 @@
+import pytest
+
+from wordpress_client import clean_title
+
+bs4 = pytest.importorskip('bs4')
+from benchmarks.title_sanitizer import CORPUS
+
+@pytest.mark.parametrize('rendered', CORPUS + [
+    '1<2 e 3>2',
+    'Preço 5 < 10 > 3 hoje',
+    'Taxa <= 5% e >= 2%',
+    'entre < e >',
+    'x <3 y',
+    'fim <',
+    'a </ b> c',
+])
+def test_clean_title_matches_beautifulsoup(rendered):
+    assert clean_title(rendered) == bs4.BeautifulSoup(rendered, 'html.parser').get_text()
@@ -1,58 +1,477 @@
 # ATUAL/wordpress_client.py
 
+import os
+import re
+import html
+import json
+import time
+import socket
+import asyncio
+import threading
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 
+try:
+    import httpx
+except ImportError:  # dependência opcional (coleta assíncrona)
+    httpx = None
+
+import database as db
+import fingerprints
+import metrics
+from async_engine import run_blocking
+from config import WORDPRESS_FEED_REUSE_MINUTES
+
+# Quantidade de notícias mantidas por site (mesmo valor do per_page da API)
+WORDPRESS_PAGE_SIZE = 10
+
+# --- AJUSTES DA SESSÃO HTTP ---
+# Timeouts separados (em segundos) para abrir a conexão e para ler a resposta
+WORDPRESS_CONNECT_TIMEOUT = 5
+WORDPRESS_READ_TIMEOUT = 15
+# Quantidade de hosts com pool mantido e de conexões simultâneas por host
+WORDPRESS_POOL_HOSTS = 32
+WORDPRESS_POOL_MAXSIZE = 4
+# Novas tentativas em erros transitórios (backoff: 0.5s, 1s, 2s, ...)
+WORDPRESS_MAX_RETRIES = 3
+WORDPRESS_BACKOFF_FACTOR = 0.5
+WORDPRESS_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class _CountingRetry(Retry):
+    """Retry do urllib3 que contabiliza cada nova tentativa em metrics.WORDPRESS_RETRIES."""
+
+    def increment(self, *args, **kwargs):
+        pool = kwargs.get('_pool')
+        metrics.WORDPRESS_RETRIES.inc(host=pool.host if pool is not None else 'desconhecido')
+        return super().increment(*args, **kwargs)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Sessão HTTP compartilhada por todos os clientes, com keep-alive e retries."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = _CountingRetry(
+                    total=WORDPRESS_MAX_RETRIES,
+                    backoff_factor=WORDPRESS_BACKOFF_FACTOR,
+                    status_forcelist=WORDPRESS_RETRY_STATUS,
+                    allowed_methods=frozenset(['GET']),
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=WORDPRESS_POOL_HOSTS,
+                    pool_maxsize=WORDPRESS_POOL_MAXSIZE,
+                    pool_block=True,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Accept': 'application/json'})
+                _session = session
+    return _session
+
+# Tags bem formadas (aceitando '>' dentro de atributos entre aspas) e marcações que o regex não trata
+# com segurança: comentários, CDATA, <script>/<style> ou um '<' que abre tag sem fechar.
+# Como no html.parser, só abre tag o '<' seguido de letra, '/', '!' ou '?'; os demais
+# ('1<2', 'Taxa <= 5%') são texto.
+_TAG_PATTERN = re.compile(r'<[a-zA-Z/!?](?:[^<>"\']|"[^"]*"|\'[^\']*\')*>')
+_COMPLEX_MARKUP_PATTERN = re.compile(r'<(?:!|\?|script|style)', re.IGNORECASE)
+_LEFTOVER_TAG_PATTERN = re.compile(r'<[a-zA-Z/!?]')
+
+def _clean_title_bs4(rendered):
+    # Importação tardia: o bs4 só é carregado quando o título tem HTML malformado
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(rendered, 'html.parser').get_text()
+
+def clean_title(rendered):
+    """Remove tags e converte entidades HTML do título, como o `get_text()` do BeautifulSoup."""
+    if '<' not in rendered:
+        return html.unescape(rendered) if '&' in rendered else rendered
+    if _COMPLEX_MARKUP_PATTERN.search(rendered):
+        return _clean_title_bs4(rendered)
+    stripped = _TAG_PATTERN.sub('', rendered)
+    if _LEFTOVER_TAG_PATTERN.search(stripped):
+        return _clean_title_bs4(rendered)
+    return html.unescape(stripped)
+
+def _parse_posts(posts):
+    noticias = []
+    for post in posts:
+        noticias.append({
+            'id': post['id'],
+            'title': clean_title(post['title']['rendered']),
+            'link': post['link'],
+            'date': post['date_gmt'] + "Z" # Adiciona Z para indicar UTC
+        })
+    return noticias
+
+def _merge_news(new_news, cached_news):
+    """Junta as notícias novas com as do cache, sem repetir IDs, mais recentes primeiro."""
+    merged = {noticia['id']: noticia for noticia in cached_news}
+    merged.update({noticia['id']: noticia for noticia in new_news})
+    return sorted(merged.values(), key=lambda n: n['date'], reverse=True)[:WORDPRESS_PAGE_SIZE]
+
+def _prepare_request(key):
+    """Lê o cache do site (chave de site_key) e monta os cabeçalhos e parâmetros da requisição condicional."""
+    cache = db.get_wordpress_fetch_cache(key)
+    cached_news = json.loads(cache['posts_json']) if cache else []
+
+    headers = {}
+    params = {'per_page': WORDPRESS_PAGE_SIZE}
+    if cache:
+        if cache['etag']:
+            headers['If-None-Match'] = cache['etag']
+        if cache['last_modified']:
+            headers['If-Modified-Since'] = cache['last_modified']
+        if cache['last_post_date'] and cached_news:
+            params['after'] = cache['last_post_date']
+    return cache, cached_news, headers, params
+
+def _store_response(key, cache, cached_news, posts, response_headers):
+    """Junta os posts recebidos com o cache e grava o novo estado do site."""
+    noticias = _merge_news(_parse_posts(posts), cached_news)
+
+    # `after` compara com a data local do post (campo 'date'), não com date_gmt
+    post_dates = [post['date'] for post in posts if post.get('date')]
+    last_post_date = max(post_dates) if post_dates else (cache['last_post_date'] if cache else None)
+
+    db.save_wordpress_fetch_cache(
+        key,
+        response_headers.get('ETag'),
+        response_headers.get('Last-Modified'),
+        last_post_date,
+        noticias
+    )
+    return noticias
+
+@metrics.timed(metrics.OPERATION_SECONDS, operation='wordpress_fetch')
 def get_latest_news(wordpress_url):
-    """Busca as notícias mais recentes de um site WordPress."""
+    """
+    Busca as notícias mais recentes de um site WordPress.
+    Usa o cache por site para fazer requisições condicionais (ETag / If-Modified-Since)
+    e pedir apenas os posts publicados depois do último já visto (`after=`).
+    """
+    site_url = wordpress_url.rstrip('/')
+    key = site_key(wordpress_url)
+    cache, cached_news, headers, params = _prepare_request(key)
+
     try:
         # Adiciona /wp-json/wp/v2/posts para acessar a API REST do WordPress
-        api_url = f"{wordpress_url.rstrip('/')}/wp-json/wp/v2/posts?per_page=10"
-        response = requests.get(api_url, timeout=15)
+        api_url = f"{site_url}/wp-json/wp/v2/posts"
+        metrics.WORDPRESS_FETCHES.inc(outcome='requisicao')
+        response = get_session().get(
+            api_url, params=params, headers=headers,
+            timeout=(WORDPRESS_CONNECT_TIMEOUT, WORDPRESS_READ_TIMEOUT)
+        )
+
+        if response.status_code == 304:
+            metrics.WORDPRESS_FETCHES.inc(outcome='nao_modificado')
+            print(f"[WORDPRESS] Nenhuma alteração em {site_url}, usando notícias em cache.")
+            db.touch_wordpress_fetch_cache(key)
+            return cached_news
+
         response.raise_for_status()
-        
-        noticias = []
-        for post in response.json():
-            # Limpa o HTML do título
-            soup = BeautifulSoup(post['title']['rendered'], 'html.parser')
-            clean_title = soup.get_text()
-
-            noticias.append({
-                'id': post['id'],
-                'title': clean_title,
-                'link': post['link'],
-                'date': post['date_gmt'] + "Z" # Adiciona Z para indicar UTC
-            })
-        return noticias
+        return _store_response(key, cache, cached_news, response.json(), response.headers)
     except requests.exceptions.RequestException as e:
+        metrics.WORDPRESS_FETCHES.inc(outcome='falha')
+        print(f"[ERRO WORDPRESS] Falha ao conectar com {wordpress_url}: {e}")
+        return []
+    except Exception as e:
+        print(f"[ERRO WORDPRESS] Falha ao processar notícias de {wordpress_url}: {e}")
+        return []
+
+# --- COLETA ASSÍNCRONA ---
+# Mesma lógica de get_latest_news, mas com httpx.AsyncClient no event loop do
+# agente: centenas de sites podem estar em andamento sem uma thread para cada.
+# O httpx é opcional; sem ele, a versão síncrona roda no executor do loop.
+
+_async_clients = {}
+
+def _get_async_client():
+    """Cliente HTTP assíncrono do loop atual, com keep-alive e limite de conexões."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(WORDPRESS_READ_TIMEOUT, connect=WORDPRESS_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=WORDPRESS_POOL_HOSTS * WORDPRESS_POOL_MAXSIZE,
+                max_keepalive_connections=WORDPRESS_POOL_HOSTS
+            ),
+            headers={'Accept-Encoding': 'gzip, deflate', 'Accept': 'application/json'}
+        )
+        _async_clients[loop] = client
+    return client
+
+async def _get_with_retries(api_url, params, headers):
+    """GET com a mesma política de retries da sessão síncrona, esperando com asyncio.sleep."""
+    for attempt in range(WORDPRESS_MAX_RETRIES + 1):
+        last_attempt = attempt == WORDPRESS_MAX_RETRIES
+        try:
+            response = await _get_async_client().get(api_url, params=params, headers=headers)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in WORDPRESS_RETRY_STATUS or last_attempt:
+                return response
+        metrics.WORDPRESS_RETRIES.inc(host=httpx.URL(api_url).host)
+        await asyncio.sleep(WORDPRESS_BACKOFF_FACTOR * (2 ** attempt))
+
+@metrics.timed(metrics.OPERATION_SECONDS, operation='wordpress_fetch')
+async def _fetch_latest_news_async(wordpress_url):
+    if httpx is None:
+        # Versão sem o timer, que já está medindo esta chamada
+        return await run_blocking(get_latest_news.__wrapped__, wordpress_url)
+
+    site_url = wordpress_url.rstrip('/')
+    key = site_key(wordpress_url)
+    cache, cached_news, headers, params = await run_blocking(_prepare_request, key)
+
+    try:
+        metrics.WORDPRESS_FETCHES.inc(outcome='requisicao')
+        response = await _get_with_retries(f"{site_url}/wp-json/wp/v2/posts", params, headers)
+
+        if response.status_code == 304:
+            metrics.WORDPRESS_FETCHES.inc(outcome='nao_modificado')
+            print(f"[WORDPRESS] Nenhuma alteração em {site_url}, usando notícias em cache.")
+            await run_blocking(db.touch_wordpress_fetch_cache, key)
+            return cached_news
+
+        response.raise_for_status()
+        return await run_blocking(_store_response, key, cache, cached_news, response.json(), response.headers)
+    except httpx.HTTPError as e:
+        metrics.WORDPRESS_FETCHES.inc(outcome='falha')
         print(f"[ERRO WORDPRESS] Falha ao conectar com {wordpress_url}: {e}")
         return []
     except Exception as e:
         print(f"[ERRO WORDPRESS] Falha ao processar notícias de {wordpress_url}: {e}")
         return []
 
-def calculate_engagement_scores(noticias):
+# --- COLETA COMPARTILHADA ENTRE CLIENTES ---
+# Franquias e edições regionais costumam apontar para o mesmo site. A coleta é
+# feita por site (chave de site_key), e o cache do banco também:
+# - buscas simultâneas do mesmo site no processo esperam a mesma requisição (single-flight);
+# - uma coleta com menos de WORDPRESS_FEED_REUSE_MINUTES serve a todos os clientes do
+#   site, inclusive nos jobs seguintes da rodada e em outras instâncias;
+# - entre instâncias, uma reserva no banco (wordpress_fetch_leases) deixa só uma buscar
+#   o site; as demais esperam a coleta dela aparecer no cache.
+
+# Duração da reserva de coleta (cobre timeouts e retries) e intervalo de espera de quem não a tem
+WORDPRESS_FETCH_LEASE_SECONDS = 120
+WORDPRESS_FETCH_WAIT_SECONDS = 0.5
+
+_inflight_fetches = {}
+_fetch_owner = f"{socket.gethostname()}-{os.getpid()}"
+
+def site_key(wordpress_url):
     """
-    Calcula um 'score' para cada notícia.
-    Atualmente, a lógica é simples: notícias mais recentes têm score maior.
+    Identidade do site para agrupar clientes: host (sem 'www.' e sem esquema),
+    porta e caminho, sem barra final. URLs inválidas usam o próprio texto.
     """
-    noticias_com_score = []
-    now = datetime.utcnow()
+    url = (wordpress_url or '').strip()
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url.rstrip('/').lower()
+    if not host:
+        return url.rstrip('/').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    default_port = {'http': 80, 'https': 443}.get(parts.scheme.lower())
+    netloc = host if port in (None, default_port) else f"{host}:{port}"
+    return netloc + parts.path.rstrip('/')
+
+async def _fetch_site_news(wordpress_url):
+    """Coleta do site reaproveitando o cache recente e com uma única coleta entre as instâncias."""
+    key = site_key(wordpress_url)
+    while True:
+        noticias = await run_blocking(db.get_fresh_wordpress_news, key, WORDPRESS_FEED_REUSE_MINUTES * 60)
+        if noticias is not None:
+            metrics.WORDPRESS_FETCHES.inc(outcome='cache_recente')
+            return noticias
+        if await run_blocking(db.claim_wordpress_fetch, key, _fetch_owner, WORDPRESS_FETCH_LEASE_SECONDS, time.time()):
+            break
+        await asyncio.sleep(WORDPRESS_FETCH_WAIT_SECONDS)
+    try:
+        return await _fetch_latest_news_async(wordpress_url)
+    finally:
+        await run_blocking(db.release_wordpress_fetch, key, _fetch_owner)
+
+async def get_latest_news_async(wordpress_url):
+    """
+    Versão assíncrona de get_latest_news (deve rodar no event loop do agente).
+    Se o mesmo site já estiver sendo buscado, espera essa coleta em vez de abrir
+    outra; se ele foi coletado há pouco, usa o cache sem acessar o site.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, site_key(wordpress_url))
+    task = _inflight_fetches.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_site_news(wordpress_url))
+        _inflight_fetches[key] = task
+        task.add_done_callback(lambda _: _inflight_fetches.pop(key, None))
+    else:
+        metrics.WORDPRESS_FETCHES.inc(outcome='agrupado')
+    # shield: um cliente cancelado (prazo da rodada) não cancela a coleta dos demais
+    noticias = await asyncio.shield(task)
+    return [dict(noticia) for noticia in noticias]
+
+class SiteFeeds:
+    """
+    Coletas de uma rodada de publicação: cada site distinto é buscado uma única
+    vez e cada cliente recebe a sua cópia das notícias.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def get(self, wordpress_url):
+        key = site_key(wordpress_url)
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(get_latest_news_async(wordpress_url))
+        else:
+            metrics.WORDPRESS_FETCHES.inc(outcome='agrupado')
+        noticias = await asyncio.shield(task)
+        return [dict(noticia) for noticia in noticias]
+
+# --- MOTOR DE SCORE ---
+# O score final é a soma ponderada de componentes. Cada componente recebe a lista
+# de notícias, o array de idades (em horas, NaN para datas inválidas) e o cliente,
+# e devolve um array NumPy com um valor por notícia.
+
+# Quantidade de análises anteriores do cliente usadas no componente de histórico
+HISTORY_METRICS_LIMIT = 200
+# Pontos máximos dados pelos componentes de palavras-chave e de histórico
+KEYWORD_MAX_POINTS = 50.0
+HISTORY_MAX_POINTS = 25.0
+
+def parse_news_dates(noticias):
+    """Converte as datas ISO (UTC, com 'Z') em datetime64 de uma vez; inválidas viram NaT."""
+    raw = [noticia.get('date') or '' for noticia in noticias]
+    try:
+        return np.array([d.rstrip('Z') for d in raw], dtype='datetime64[s]')
+    except ValueError:
+        parsed = []
+        for d in raw:
+            try:
+                parsed.append(np.datetime64(d.rstrip('Z'), 's'))
+            except ValueError:
+                parsed.append(np.datetime64('NaT'))
+        return np.array(parsed, dtype='datetime64[s]')
 
-    for noticia in noticias:
+def recency_component(noticias, ages_hours, client):
+    # Inverte a idade da notícia (em horas): notícias mais novas recebem score maior.
+    # Adiciona 1 para evitar divisão por zero; datas inválidas ficam com 0.
+    scores = 100.0 / (np.clip(ages_hours, 0, None) + 1.0)
+    return np.nan_to_num(scores, nan=0.0)
+
+def _title_norm(noticia):
+    # Artefato guardado no índice de impressões digitais (fingerprints.annotate), quando presente
+    return noticia.get('title_norm') or fingerprints.normalize_title(noticia['title'])
+
+def _title_tokens(noticia):
+    tokens = noticia.get('tokens')
+    return tokens if tokens is not None else fingerprints.title_tokens(_title_norm(noticia))
+
+def keyword_component(noticias, ages_hours, client):
+    """
+    Bônus proporcional às palavras-chave do nicho do cliente presentes no título.
+    Cada palavra-chave (ou expressão) precisa aparecer como palavra inteira:
+    'rio' não conta em 'horário'.
+    """
+    raw_keywords = client['remix_niche_keywords'] if client else None
+    # Títulos normalizados têm palavras separadas por um único espaço; com espaços
+    # nas pontas, a busca por ' palavra ' respeita os limites das palavras
+    keywords = [f" {fingerprints.normalize_title(k)} " for k in (raw_keywords or '').split(',') if k.strip()]
+    keywords = [k for k in keywords if k.strip()]
+    if not keywords:
+        return np.zeros(len(noticias))
+    titles = [f" {_title_norm(noticia)} " for noticia in noticias]
+    hits = np.fromiter(
+        (sum(k in title for k in keywords) for title in titles),
+        dtype=float, count=len(noticias)
+    )
+    return KEYWORD_MAX_POINTS * hits / len(keywords)
+
+def history_component(noticias, ages_hours, client):
+    """
+    Afinidade com o histórico do cliente. A tabela news_metrics não guarda cliques,
+    então usamos os termos dos títulos já selecionados (ponderados pelo score) como
+    aproximação do que costuma performar para aquele público.
+    """
+    if not client:
+        return np.zeros(len(noticias))
+    history = db.get_recent_news_metric_titles(client['id'], HISTORY_METRICS_LIMIT)
+    if not history:
+        return np.zeros(len(noticias))
+    term_weights = {}
+    for row in history:
+        for term in fingerprints.title_tokens(fingerprints.normalize_title(row['title'])):
+            term_weights[term] = term_weights.get(term, 0.0) + (row['score'] or 0.0)
+    top_weight = max(term_weights.values(), default=0.0)
+    if top_weight <= 0:
+        return np.zeros(len(noticias))
+    affinity = np.fromiter(
+        (max((term_weights.get(t, 0.0) for t in _title_tokens(noticia)), default=0.0)
+         for noticia in noticias),
+        dtype=float, count=len(noticias)
+    )
+    return HISTORY_MAX_POINTS * affinity / top_weight
+
+# Componentes ativos e seus pesos; use register_score_component para incluir novos
+SCORE_COMPONENTS = {
+    'recency': (recency_component, 1.0),
+    'keywords': (keyword_component, 1.0),
+    'history': (history_component, 1.0),
+}
+
+def register_score_component(name, func, weight=1.0):
+    SCORE_COMPONENTS[name] = (func, weight)
+
+@metrics.timed(metrics.OPERATION_SECONDS, operation='scoring')
+def calculate_engagement_scores(noticias, client=None, top_k=None):
+    """
+    Calcula um 'score' para cada notícia e devolve a lista ordenada do maior para o menor.
+    Com `top_k`, devolve apenas as k melhores (sem ordenar a lista inteira).
+    Sem `client`, só os componentes que não dependem do cliente contribuem.
+    """
+    if not noticias:
+        return []
+
+    dates = parse_news_dates(noticias)
+    now = np.datetime64(datetime.utcnow().replace(microsecond=0), 's')
+    ages_hours = (now - dates).astype('timedelta64[s]').astype(float) / 3600
+    ages_hours[np.isnat(dates)] = np.nan
+
+    scores = np.zeros(len(noticias))
+    for name, (func, weight) in SCORE_COMPONENTS.items():
         try:
-            post_date = datetime.strptime(noticia['date'], '%Y-%m-%dT%H:%M:%SZ')
-            age = now - post_date
-            
-            # Lógica de Score: Inverte a idade da notícia (em horas)
-            # Notícias mais novas (idade menor) recebem score maior.
-            # Adiciona 1 para evitar divisão por zero.
-            score = 100 / (age.total_seconds() / 3600 + 1)
-            
-            noticia['score'] = score
-            noticias_com_score.append(noticia)
-        except Exception:
-            # Se a data for inválida, atribui score 0
-            noticia['score'] = 0
-            noticias_com_score.append(noticia)
\ No newline at end of file
+            scores += weight * func(noticias, ages_hours, client)
+        except Exception as e:
+            print(f"[ERRO SCORE] Componente '{name}' falhou e foi ignorado: {e}")
+
+    if top_k is not None and top_k < len(noticias):
+        selected = np.argpartition(-scores, top_k - 1)[:top_k] if top_k > 0 else np.array([], dtype=int)
+    else:
+        selected = np.arange(len(noticias))
+    selected = selected[np.argsort(-scores[selected], kind='stable')]
+
+    noticias_com_score = []
+    for index in selected:
+        noticia = noticias[index]
+        noticia['score'] = float(scores[index])
+        noticias_com_score.append(noticia)
+    return noticias_com_score